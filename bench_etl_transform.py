@@ -0,0 +1,110 @@
+"""Benchmark: map_csv_to_schema (columnar) vs the previous iterrows implementation."""
+import argparse
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from import_to_lazada_etl import extract_lazada_id, map_csv_to_schema
+
+
+def map_csv_to_schema_rowwise(df, category_name):
+    """The per-row implementation map_csv_to_schema replaced, kept as the baseline."""
+    mapped_data = []
+    for _, row in df.iterrows():
+        url = row.get('url_san_pham', '')
+        product = {
+            'id': str(uuid.uuid4()),
+            'lazada_id': extract_lazada_id(url),
+            'name': row.get('ten_san_pham', ''),
+            'price': float(row.get('gia_sale', 0)) if pd.notna(row.get('gia_sale')) else None,
+            'original_price': float(row.get('gia_goc', 0)) if pd.notna(row.get('gia_goc')) else None,
+            'discount': None,
+            'url': url,
+            'image_url': row.get('link_anh', ''),
+            'category': category_name,
+            'brand': None,
+            'sold_count': None,
+            'rating_score': float(row.get('rating', 0)) if pd.notna(row.get('rating')) else None,
+            'rating_count': int(row.get('so_review', 0)) if pd.notna(row.get('so_review')) else 0,
+            'is_verified': False,
+            'is_duplicate': False,
+            'extracted_at': datetime.now(),
+            'transformed_at': None,
+            'loaded_at': datetime.now(),
+            'created_at': datetime.now(),
+            'updated_at': datetime.now()
+        }
+        if product['original_price'] and product['price']:
+            product['discount'] = round((1 - product['price'] / product['original_price']) * 100, 2)
+        mapped_data.append(product)
+    return pd.DataFrame(mapped_data)
+
+
+def make_frame(rows, seed=0):
+    """Synthetic product CSV as load_csvs reads it (dtype=str, some blanks)."""
+    rng = np.random.default_rng(seed)
+    item_ids = rng.integers(10**9, 10**10, rows)
+    price = rng.integers(10, 2000, rows) * 1000
+    original = price + rng.integers(0, 500, rows) * 1000
+    rating = np.round(rng.uniform(3, 5, rows), 1)
+    reviews = rng.integers(0, 5000, rows)
+    df = pd.DataFrame({
+        "ten_san_pham": pd.Series(item_ids).map("San pham {}".format),
+        "gia_sale": price.astype(str),
+        "gia_goc": original.astype(str),
+        "rating": rating.astype(str),
+        "so_review": reviews.astype(str),
+        "link_anh": pd.Series(item_ids).map("https://img.lazcdn.com/g/p/{}.jpg".format),
+        "url_san_pham": pd.Series(item_ids).map("https://www.lazada.vn/products/pdp-i{}.html".format),
+    })
+    blanks = rng.random(rows) < 0.05
+    df.loc[blanks, ["gia_goc", "rating"]] = np.nan
+    return df
+
+
+def check_same_output(df):
+    """Both implementations agree on every column except the generated ids / timestamps."""
+    fast = map_csv_to_schema(df, "bench")
+    slow = map_csv_to_schema_rowwise(df, "bench")
+    assert list(fast.columns) == list(slow.columns)
+    for col in ["lazada_id", "name", "price", "original_price", "discount", "url", "image_url",
+                "category", "rating_score", "rating_count", "is_duplicate"]:
+        pd.testing.assert_series_equal(
+            fast[col].astype(object).where(fast[col].notna(), None),
+            slow[col].astype(object).where(slow[col].notna(), None),
+            check_names=False,
+        )
+    assert fast["id"].str.len().eq(36).all() and fast["id"].is_unique
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--rowwise-rows", type=int, default=50_000,
+                        help="Rows for the iterrows baseline (timed, then scaled to --rows)")
+    args = parser.parse_args()
+
+    check_same_output(make_frame(2_000, seed=1))
+    print("[INFO] Output của hai cách map giống nhau (trừ id / timestamp)")
+
+    df = make_frame(args.rows)
+    start = time.perf_counter()
+    map_csv_to_schema(df, "bench")
+    columnar = time.perf_counter() - start
+
+    sample = df.head(args.rowwise_rows)
+    start = time.perf_counter()
+    map_csv_to_schema_rowwise(sample, "bench")
+    rowwise = (time.perf_counter() - start) * len(df) / len(sample)
+
+    print(f"\n{'cách map':>10} {'giây':>9} {'dòng/s':>12}")
+    print(f"{'iterrows':>10} {rowwise:9.2f} {len(df) / rowwise:12,.0f}  (ngoại suy từ {len(sample):,} dòng)")
+    print(f"{'columnar':>10} {columnar:9.2f} {len(df) / columnar:12,.0f}")
+    print(f"\nSpeedup: {rowwise / columnar:.1f}x trên {len(df):,} dòng")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark: serial vs parallel CSV ingestion of merge_csv (speedup theo số core)."""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from merge_csv import read_files_parallel
+from product_store import PRODUCT_FIELDS, pin_product_schema, read_products
+
+
+def make_dataset(folder, n_files, rows_per_file, seed=0):
+    """Tạo n_files CSV giả lập theo đúng cột của lazada_crawler"""
+    rng = random.Random(seed)
+    paths = []
+    for file_no in range(n_files):
+        rows = []
+        for row_no in range(rows_per_file):
+            item_id = rng.randrange(10**9, 10**10)
+            price = rng.randrange(10, 2000) * 1000
+            rows.append({
+                "ten_san_pham": f"San pham {file_no}-{row_no}",
+                "gia_sale": price,
+                "gia_goc": price + rng.randrange(0, 500) * 1000,
+                "rating": round(rng.uniform(3, 5), 1) if rng.random() > 0.1 else "",
+                "so_review": rng.randrange(0, 5000),
+                "link_anh": f"https://img.lazcdn.com/g/p/{item_id}.jpg",
+                "shop": f"shop_{rng.randrange(500)}",
+                "category": f"cat_{file_no % 8}",
+                "url_san_pham": f"https://www.lazada.vn/products/pdp-i{item_id}.html",
+            })
+        path = os.path.join(folder, f"lazada_products_bench_{file_no:03d}.csv")
+        pd.DataFrame(rows, columns=PRODUCT_FIELDS).to_csv(path, index=False, encoding="utf-8-sig")
+        paths.append(path)
+    return paths
+
+
+def time_serial(paths):
+    start = time.perf_counter()
+    frames = [pin_product_schema(read_products(p)) for p in paths]
+    rows = len(pd.concat(frames, ignore_index=True))
+    return time.perf_counter() - start, rows
+
+
+def time_parallel(paths, workers, engine):
+    start = time.perf_counter()
+    frames = [df for _, df, _ in read_files_parallel(paths, workers=workers, engine=engine)]
+    rows = len(pd.concat(frames, ignore_index=True))
+    return time.perf_counter() - start, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=50_000, help="Số dòng mỗi file")
+    parser.add_argument("--engine", choices=["process", "arrow"], default="process")
+    parser.add_argument("--repeat", type=int, default=3, help="Lấy thời gian tốt nhất sau N lần")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({w for w in (1, 2, 4, 8, 16, 32, cores) if w <= cores})
+
+    folder = tempfile.mkdtemp(prefix="bench_merge_")
+    try:
+        print(f"[INFO] Tạo {args.files} file x {args.rows} dòng trong {folder} ...")
+        paths = make_dataset(folder, args.files, args.rows)
+        size_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+
+        base, rows = min(time_serial(paths) for _ in range(args.repeat))
+        print(f"\nCPU cores: {cores} | engine: {args.engine} | {rows:,} dòng, {size_mb:.1f} MB")
+        print(f"{'workers':>8} {'giây':>8} {'dòng/s':>12} {'speedup':>8}")
+        print(f"{'serial':>8} {base:8.2f} {rows / base:12,.0f} {1.0:8.2f}")
+        for workers in worker_counts:
+            elapsed, _ = min(time_parallel(paths, workers, args.engine) for _ in range(args.repeat))
+            print(f"{workers:>8} {elapsed:8.2f} {rows / elapsed:12,.0f} {base / elapsed:8.2f}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
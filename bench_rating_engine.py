@@ -0,0 +1,86 @@
+"""Benchmark: rating_engine.generate_ratings vs the previous per-review random.choices loop."""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from rating_engine import generate_ratings
+
+
+def generate_ratings_loop(n, target_avg):
+    """The per-element implementation both review scripts used, kept as the baseline."""
+    if n == 0:
+        return []
+    target_avg = max(1.0, min(5.0, target_avg))
+    target_sum = target_avg * n
+    ratings = []
+    for _ in range(n):
+        if target_avg >= 4.0:
+            rating = random.choices([1, 2, 3, 4, 5], weights=[1, 2, 5, 15, 25])[0]
+        elif target_avg >= 3.0:
+            rating = random.choices([1, 2, 3, 4, 5], weights=[3, 5, 15, 12, 8])[0]
+        else:
+            rating = random.choices([1, 2, 3, 4, 5], weights=[15, 12, 10, 5, 2])[0]
+        ratings.append(rating)
+    diff = target_sum - sum(ratings)
+    if diff != 0:
+        indices = list(range(n))
+        random.shuffle(indices)
+        for idx in indices:
+            if abs(diff) < 0.01:
+                break
+            if diff > 0:
+                increase = min(diff, 5.0 - ratings[idx])
+                ratings[idx] += increase
+                diff -= increase
+            else:
+                decrease = min(abs(diff), ratings[idx] - 1.0)
+                ratings[idx] -= decrease
+                diff += decrease
+    ratings = [round(float(r), 2) for r in ratings]
+    random.shuffle(ratings)
+    return ratings
+
+
+def check_engine(trials=2_000, seed=0):
+    """Exact average, bounds and reproducibility over random (n, target) pairs."""
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        n = int(rng.integers(1, 3_000))
+        target = round(float(rng.uniform(0.5, 5.5)), 1)
+        ratings = generate_ratings(n, target, rng=int(rng.integers(2**32)))
+        expected = max(1.0, min(5.0, target)) * n
+        assert len(ratings) == n and ratings.min() >= 1.0 and ratings.max() <= 5.0
+        assert abs(ratings.sum() - expected) < 0.01, (n, target, ratings.sum(), expected)
+    assert np.array_equal(generate_ratings(500, 4.3, rng=7), generate_ratings(500, 4.3, rng=7))
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 50_000])
+    parser.add_argument("--target", type=float, default=4.7)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    check_engine()
+    print("[INFO] Kiểm tra: trung bình đúng target, rating trong [1, 5], cùng seed cùng kết quả")
+
+    print(f"\n{'n':>8} {'loop (ms)':>11} {'numpy (ms)':>11} {'speedup':>8}")
+    for n in args.sizes:
+        loop = best_of(lambda: generate_ratings_loop(n, args.target), args.repeat)
+        vectorized = best_of(lambda: generate_ratings(n, args.target, rng=1), args.repeat)
+        print(f"{n:>8,} {loop * 1000:11.2f} {vectorized * 1000:11.3f} {loop / vectorized:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compressed on-disk cache of raw catalog AJAX responses, keyed by (q, page)."""
+import gzip
+import hashlib
+import json
+import os
+import time
+
+DEFAULT_CACHE_DIR = ".lazada_cache"
+DEFAULT_TTL = 24 * 3600
+
+
+class CatalogCache:
+    """Content-addressed store of catalog JSON bodies.
+
+    Each entry lives at <root>/<hh>/<sha256>.json.gz where the hash is taken over the
+    request params, so the same (q, page) always maps to the same file. Entries older
+    than `ttl` seconds are treated as misses for live crawls; replay reads them
+    regardless of age. ttl=None keeps entries forever.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.root = root
+        self.ttl = ttl
+
+    @staticmethod
+    def key(keyword, page):
+        params = json.dumps({"page": int(page), "q": keyword}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+    def _path(self, keyword, page):
+        digest = self.key(keyword, page)
+        return os.path.join(self.root, digest[:2], digest + ".json.gz")
+
+    def get(self, keyword, page, ignore_ttl=False):
+        """Return the cached raw body (bytes) or None on a miss / expired entry."""
+        path = self._path(keyword, page)
+        try:
+            with gzip.open(path, "rb") as f:
+                entry = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+        if not ignore_ttl and self.ttl is not None and time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry["body"].encode("utf-8")
+
+    def put(self, keyword, page, body):
+        path = self._path(keyword, page)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = {
+            "q": keyword,
+            "page": int(page),
+            "fetched_at": time.time(),
+            "body": body.decode("utf-8") if isinstance(body, bytes) else body,
+        }
+        # Write to a temp file first so a crash never leaves a half-written entry behind.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        os.replace(tmp_path, path)
@@ -0,0 +1,114 @@
+"""Per-item fingerprint store for delta crawls (new / changed / removed events)."""
+import hashlib
+import json
+import sqlite3
+import time
+
+import product_store
+
+DEFAULT_STORE_PATH = ".lazada_fingerprints.sqlite"
+
+# Crawler columns whose change makes an item "changed" (price, originalPrice, ratingScore, review).
+TRACKED_FIELDS = ["gia_sale", "gia_goc", "rating", "so_review"]
+
+EVENT_FIELDS = ["change_type", "product_id", "changed_fields"]
+
+
+def product_id_from_url(url):
+    """Numeric Lazada item id from url_san_pham, or the URL itself if it has none."""
+    if not url:
+        return None
+    return product_store.product_id_from_url(url) or url
+
+
+def _fingerprint(values):
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class FingerprintStore:
+    """SQLite table of the last seen tracked values for every (keyword, product_id).
+
+    apply() compares one full crawl snapshot of a keyword against the store, returns
+    the change events and updates the store in a single transaction. Removed items
+    are only meaningful when the snapshot covers the keyword's whole catalog, so
+    pass detect_removed=False for partial page ranges.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                keyword TEXT NOT NULL,
+                product_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                tracked TEXT NOT NULL,
+                row TEXT NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (keyword, product_id)
+            )
+        """)
+        self.conn.commit()
+
+    def apply(self, keyword, items, detect_removed=True):
+        now = time.time()
+        previous = {
+            product_id: (fingerprint, json.loads(tracked), json.loads(row))
+            for product_id, fingerprint, tracked, row in self.conn.execute(
+                "SELECT product_id, fingerprint, tracked, row FROM fingerprints WHERE keyword = ?",
+                (keyword,),
+            )
+        }
+
+        events = []
+        upserts = []
+        seen = set()
+        for item in items:
+            product_id = product_id_from_url(item.get("url_san_pham"))
+            if not product_id or product_id in seen:
+                continue
+            seen.add(product_id)
+
+            tracked = {field: item.get(field) for field in TRACKED_FIELDS}
+            fingerprint = _fingerprint([tracked[field] for field in TRACKED_FIELDS])
+            old = previous.get(product_id)
+
+            if old is None:
+                events.append({"change_type": "new", "product_id": product_id, "changed_fields": "", **item})
+            elif old[0] != fingerprint:
+                changed = [field for field in TRACKED_FIELDS if old[1].get(field) != tracked[field]]
+                events.append({
+                    "change_type": "changed",
+                    "product_id": product_id,
+                    "changed_fields": ",".join(changed),
+                    **item,
+                })
+
+            upserts.append((
+                keyword, product_id, fingerprint,
+                json.dumps(tracked, ensure_ascii=False), json.dumps(item, ensure_ascii=False), now,
+            ))
+
+        removed = [pid for pid in previous if pid not in seen] if detect_removed else []
+        for product_id in removed:
+            events.append({
+                "change_type": "removed",
+                "product_id": product_id,
+                "changed_fields": "",
+                **previous[product_id][2],
+            })
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                upserts,
+            )
+            self.conn.executemany(
+                "DELETE FROM fingerprints WHERE keyword = ? AND product_id = ?",
+                [(keyword, product_id) for product_id in removed],
+            )
+
+        return events
+
+    def close(self):
+        self.conn.close()
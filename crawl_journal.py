@@ -0,0 +1,92 @@
+"""Append-only journal of crawled (keyword, page) units for resumable crawls."""
+import json
+import os
+
+
+class CrawlJournal:
+    """One JSON line per finished catalog page: {"keyword", "page", "items"}, plus
+    "last_page" when the page revealed the keyword's real last page.
+
+    Every record is flushed and fsync'ed before the crawler moves on, so a crash
+    loses at most the page that was in flight. Opening with resume=False starts a
+    fresh journal; resume=True replays the existing lines so finished pages can be
+    skipped and the final CSV rebuilt from disk.
+
+    Only the byte offset of every page's line is kept in memory; items() reads the
+    lines back from the file, so memory does not grow with the number of items.
+    last_page() gives a resumed crawl the real last page earlier runs found, so it
+    does not request pages past it again.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._offsets = {}
+        self._last_pages = {}
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        if resume:
+            self._load()
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash mid-write leaves a truncated last line; that page is simply re-fetched.
+                    entry = None
+                if entry is not None:
+                    self._offsets[(entry["keyword"], int(entry["page"]))] = offset
+                    # Journals written before "last_page" existed: an empty page is the end
+                    last_page = entry.get("last_page") or (None if entry["items"] else entry["page"])
+                    self._note_last_page(entry["keyword"], last_page)
+                offset += len(line)
+
+    def _note_last_page(self, keyword, last_page):
+        if last_page:
+            self._last_pages[keyword] = min(self._last_pages.get(keyword, last_page), int(last_page))
+
+    def completed_pages(self, keyword):
+        return {page for (kw, page) in self._offsets if kw == keyword}
+
+    def last_page(self, keyword):
+        """Real last page of keyword recorded by any journaled page, or None."""
+        return self._last_pages.get(keyword)
+
+    def record(self, keyword, page, items, last_page=None):
+        entry = {"keyword": keyword, "page": page, "items": items}
+        if last_page:
+            entry["last_page"] = last_page
+        line = json.dumps(entry, ensure_ascii=False)
+        with open(self.path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write((line + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self._offsets[(keyword, page)] = offset
+        self._note_last_page(keyword, last_page)
+
+    def items(self, keyword, start_page, end_page):
+        """All journaled items for keyword in page order, read back from the journal file."""
+        offsets = [
+            self._offsets[(keyword, page)]
+            for page in range(start_page, end_page + 1)
+            if (keyword, page) in self._offsets
+        ]
+        if not offsets:
+            return []
+
+        results = []
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                results.extend(json.loads(f.readline())["items"])
+        return results
@@ -0,0 +1,171 @@
+"""Crawl telemetry: per-request latency, bytes, items per page, status / content-type counters."""
+import json
+import os
+import time
+
+# Prometheus-style cumulative latency buckets, in seconds.
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class CrawlMetrics:
+    """Collects crawl measurements and exports them as JSON or a Prometheus text file.
+
+    Time spent waiting on purpose (fixed sleeps, rate limiter, retry backoff) is
+    tracked separately from request latency, so a slow run can be attributed to
+    throttling, payload growth or our own pacing. If `prom_path` is set the text
+    file is rewritten at most every `export_interval` seconds while the crawl runs.
+    """
+
+    def __init__(self, prom_path=None, export_interval=30.0):
+        self.started = time.monotonic()
+        self.prom_path = prom_path
+        self.export_interval = export_interval
+        self._last_export = self.started
+
+        self.latencies = []
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.response_bytes = 0
+        self.status_counts = {}
+        self.content_type_counts = {}
+        self.errors = 0
+        self.retries = {}
+        self.wait_seconds = {}
+        self.pages = 0
+        self.items = 0
+        self.empty_pages = 0
+        self.cache_hits = 0
+
+    def observe_request(self, latency, status, content_type, nbytes):
+        self.latencies.append(latency)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.latency_buckets[index] += 1
+        self.response_bytes += nbytes
+
+        status_key = str(status) if status is not None else "error"
+        self.status_counts[status_key] = self.status_counts.get(status_key, 0) + 1
+        if status is None:
+            self.errors += 1
+
+        media_type = content_type.split(";")[0].strip() or "unknown"
+        self.content_type_counts[media_type] = self.content_type_counts.get(media_type, 0) + 1
+        self._maybe_export()
+
+    def observe_retry(self, reason):
+        self.retries[reason] = self.retries.get(reason, 0) + 1
+
+    def observe_wait(self, kind, seconds):
+        """Deliberate waiting: kind is e.g. "sleep", "rate_limit" or "backoff"."""
+        self.wait_seconds[kind] = self.wait_seconds.get(kind, 0.0) + seconds
+
+    def observe_page(self, n_items, from_cache=False):
+        self.pages += 1
+        self.items += n_items
+        if not n_items:
+            self.empty_pages += 1
+        if from_cache:
+            self.cache_hits += 1
+        self._maybe_export()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+        failed = self.errors + sum(
+            count for status, count in self.status_counts.items() if status not in ("200", "error")
+        )
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": requests,
+            "failed_requests": failed,
+            "error_rate": round(failed / requests, 4) if requests else 0.0,
+            "retries": dict(self.retries),
+            "latency_seconds": {
+                "mean": round(sum(latencies) / requests, 4) if requests else None,
+                "p50": _quantile(latencies, 0.50),
+                "p90": _quantile(latencies, 0.90),
+                "p99": _quantile(latencies, 0.99),
+                "max": latencies[-1] if latencies else None,
+            },
+            "response_bytes": {
+                "total": self.response_bytes,
+                "mean": round(self.response_bytes / requests, 1) if requests else None,
+            },
+            "status_codes": dict(self.status_counts),
+            "content_types": dict(self.content_type_counts),
+            "pages": self.pages,
+            "empty_pages": self.empty_pages,
+            "cache_hits": self.cache_hits,
+            "items": self.items,
+            "items_per_page": round(self.items / self.pages, 2) if self.pages else None,
+            "items_per_second": round(self.items / elapsed, 3) if elapsed else None,
+            "wait_seconds": {kind: round(seconds, 3) for kind, seconds in self.wait_seconds.items()},
+        }
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+        return path
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP lazada_request_latency_seconds Catalog request latency.",
+            "# TYPE lazada_request_latency_seconds histogram",
+        ]
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            lines.append(f'lazada_request_latency_seconds_bucket{{le="{bound}"}} {count}')
+        lines.append(f'lazada_request_latency_seconds_bucket{{le="+Inf"}} {len(self.latencies)}')
+        lines.append(f"lazada_request_latency_seconds_sum {sum(self.latencies)}")
+        lines.append(f"lazada_request_latency_seconds_count {len(self.latencies)}")
+
+        lines += ["# TYPE lazada_requests_total counter"]
+        lines += [f'lazada_requests_total{{status="{s}"}} {n}' for s, n in sorted(self.status_counts.items())]
+        lines += ["# TYPE lazada_responses_by_content_type_total counter"]
+        lines += [
+            f'lazada_responses_by_content_type_total{{content_type="{c}"}} {n}'
+            for c, n in sorted(self.content_type_counts.items())
+        ]
+        lines += ["# TYPE lazada_retries_total counter"]
+        lines += [f'lazada_retries_total{{reason="{r}"}} {n}' for r, n in sorted(self.retries.items())]
+        lines += ["# TYPE lazada_wait_seconds_total counter"]
+        lines += [f'lazada_wait_seconds_total{{kind="{k}"}} {s}' for k, s in sorted(self.wait_seconds.items())]
+        lines += [
+            "# TYPE lazada_response_bytes_total counter",
+            f"lazada_response_bytes_total {self.response_bytes}",
+            "# TYPE lazada_pages_total counter",
+            f"lazada_pages_total {self.pages}",
+            "# TYPE lazada_empty_pages_total counter",
+            f"lazada_empty_pages_total {self.empty_pages}",
+            "# TYPE lazada_cache_hits_total counter",
+            f"lazada_cache_hits_total {self.cache_hits}",
+            "# TYPE lazada_items_total counter",
+            f"lazada_items_total {self.items}",
+            "# TYPE lazada_crawl_elapsed_seconds gauge",
+            f"lazada_crawl_elapsed_seconds {time.monotonic() - self.started}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _write_atomic(path, self.prometheus_text())
+        return path
+
+    def _maybe_export(self):
+        if not self.prom_path:
+            return
+        now = time.monotonic()
+        if now - self._last_export >= self.export_interval:
+            self._last_export = now
+            self.write_prometheus(self.prom_path)
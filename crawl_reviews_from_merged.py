@@ -1,12 +1,33 @@
 """
 Script để crawl fake reviews từ file CSV đã merge
 """
-import csv
-import random
+import json
+import os
 import time
-import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List
+
+import numpy as np
+
+from product_store import product_id_from_url, read_review_source, reviewable_products
+from rating_engine import generate_ratings, product_rng
+from review_writer import (
+    COMPRESSION_SUFFIXES,
+    DEFAULT_CHUNK_ROWS,
+    ReviewStreamWriter,
+    concat_review_files,
+    open_text_output,
+    with_compression_suffix,
+)
+from user_pool import DEFAULT_ACTIVITY_EXPONENT, DEFAULT_USERS, activity_cdf, build_users, draw_user_ids
+
+# Tên người review nằm trong bảng users, review chỉ giữ user_id
+REVIEW_FIELDS = ["product_id", "user_id", "rating", "review_index"]
+
+# Số sản phẩm mỗi shard; cố định, không phụ thuộc số worker
+DEFAULT_SHARD_PRODUCTS = 10_000
 
 # Vietnamese names
 FIRST_NAMES = [
@@ -23,76 +44,54 @@ LAST_NAMES = [
 ]
 
 
-def make_name() -> str:
-    return f"{random.choice(LAST_NAMES)} {random.choice(FIRST_NAMES)}"
-
-
 def extract_product_id(url: str) -> str:
     """Extract product ID from Lazada URL"""
     if not url:
         return ""
-    match = re.search(r'-i(\d+)\.html', url)
-    if match:
-        return match.group(1)
-    return url
-
-
-def generate_ratings_with_average(n: int, target_avg: float) -> List[float]:
-    """Generate n ratings that average to target_avg"""
-    if n == 0:
-        return []
-    
-    target_avg = max(1.0, min(5.0, target_avg))
-    target_sum = target_avg * n
-    
-    # Generate ratings weighted toward target
-    ratings = []
-    for _ in range(n):
-        if target_avg >= 4.0:
-            rating = random.choices([1, 2, 3, 4, 5], weights=[1, 2, 5, 15, 25])[0]
-        elif target_avg >= 3.0:
-            rating = random.choices([1, 2, 3, 4, 5], weights=[3, 5, 15, 12, 8])[0]
-        else:
-            rating = random.choices([1, 2, 3, 4, 5], weights=[15, 12, 10, 5, 2])[0]
-        ratings.append(rating)
-    
-    # Adjust to match exact target sum
-    current_sum = sum(ratings)
-    diff = target_sum - current_sum
-    
-    if diff != 0:
-        indices = list(range(n))
-        random.shuffle(indices)
-        
-        for idx in indices:
-            if abs(diff) < 0.01:
-                break
-            
-            if diff > 0:
-                max_increase = 5.0 - ratings[idx]
-                increase = min(diff, max_increase)
-                ratings[idx] += increase
-                diff -= increase
-            else:
-                max_decrease = ratings[idx] - 1.0
-                decrease = min(abs(diff), max_decrease)
-                ratings[idx] -= decrease
-                diff += decrease
-    
-    ratings = [round(float(r), 2) for r in ratings]
-    random.shuffle(ratings)
-    
-    return ratings
+    return product_id_from_url(url) or url
+
 
+def generate_ratings_with_average(n: int, target_avg: float, rng=None) -> List[float]:
+    """Generate n ratings that average to target_avg (xem rating_engine.generate_ratings)"""
+    return generate_ratings(n, target_avg, rng).tolist()
 
-def crawl_reviews_from_csv(csv_file: str, output_file: str = None):
+
+def crawl_reviews_from_csv(csv_file: str, output_file: str = None, seed: int = None,
+                           compression: str = None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                           workers: int = None, shard_products: int = DEFAULT_SHARD_PRODUCTS,
+                           concat: bool = False, n_users: int = DEFAULT_USERS,
+                           activity_exponent: float = DEFAULT_ACTIVITY_EXPONENT):
     """
     Crawl fake reviews từ file CSV đã merge
     
+    Reviews được ghi ra file theo từng chunk ngay khi sinh xong mỗi sản phẩm và thống kê
+    được cộng dồn trong cùng lượt đó, nên bộ nhớ không tăng theo tổng số review.
+    
+    Người review lấy từ bảng users (user_id, name) sinh một lần từ seed và ghi ra
+    <output>_users.csv khi có ít nhất một review; mỗi review chỉ giữ user_id. Độ hoạt động của user theo luật
+    lũy thừa: user_id k được chọn với trọng số 1 / k**activity_exponent.
+    
+    Mọi giá trị ngẫu nhiên của một sản phẩm (rating, user_id) lấy từ stream riêng
+    product_rng(seed, product_id), nên kết quả không phụ thuộc thứ tự hay cách chia
+    sản phẩm: chạy tuần tự hay với bất kỳ số worker nào cũng ra đúng cùng các byte.
+    
     Args:
-        csv_file: Đường dẫn tới file CSV merged
-        output_file: Tên file output (mặc định: reviews_TIMESTAMP.csv)
+        csv_file: Đường dẫn tới file CSV merged (hoặc file / thư mục Parquet)
+        output_file: Tên file output (mặc định: reviews_TIMESTAMP.csv); đuôi .gz / .zst thì nén
+        seed: Seed để chạy lại ra đúng cùng một file (mặc định: ngẫu nhiên)
+        compression: None, "gzip" hoặc "zstd" (thêm đuôi tương ứng vào output_file)
+        chunk_rows: Số dòng mỗi lần ghi ra file
+        workers: Số process; có giá trị thì chia sản phẩm thành shard, ghi
+            <output>_shards/part-*.csv kèm manifest.json (mặc định: chạy tuần tự, một file)
+        shard_products: Số sản phẩm mỗi shard
+        concat: Ghép các shard thành output_file sau khi sinh xong
+        n_users: Số user trong bảng users
+        activity_exponent: Số mũ phân bố hoạt động (0 = đều, càng lớn càng dồn vào ít user)
     """
+    if seed is None:
+        # Vẫn cần một master seed chung để các worker sinh cùng một kết quả
+        seed = int(np.random.SeedSequence().entropy)
+        print(f"[INFO] Seed: {seed}")
     
     print("=" * 60)
     print("CRAWL REVIEWS FROM MERGED CSV")
@@ -105,120 +104,215 @@ def crawl_reviews_from_csv(csv_file: str, output_file: str = None):
     
     print(f"\n[INFO] Đọc file: {csv_path.name}")
     
-    # Đọc products từ CSV
-    products = []
+    # Đọc products từ CSV (hoặc kho Parquet): chỉ 3 cột rating / số review / url,
+    # tên cột thay thế (Rating, review_count, url, ...) được dò một lần theo header
     try:
-        with csv_path.open(newline="", encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                products.append(row)
+        products = read_review_source(csv_path)
     except Exception as e:
         print(f"[ERROR] Lỗi khi đọc file: {e}")
         return None
     
     print(f"[INFO] Đã đọc {len(products)} sản phẩm")
-    
-    # Generate fake reviews
-    reviews = []
-    products_with_reviews = 0
-    total_reviews = 0
-    
-    for i, p in enumerate(products, 1):
-        # Tìm các trường có thể chứa rating và review count
-        rating = (p.get("rating") or p.get("Rating") or 
-                 p.get("rating_score") or p.get("ratingScore"))
-        review_count = (p.get("so_review") or p.get("review_count") or 
-                       p.get("review") or p.get("reviews"))
-        url = (p.get("url_san_pham") or p.get("url") or 
-              p.get("productUrl") or p.get("item_url"))
-        product_name = (p.get("ten_san_pham") or p.get("name") or 
-                       p.get("product_name") or "Unknown")
-        
-        if not url:
-            continue
-        
-        try:
-            review_count = int(float(review_count)) if review_count else 0
-        except:
-            review_count = 0
-        
-        try:
-            target_rating = float(rating) if rating else None
-        except:
-            target_rating = None
-        
-        if review_count > 0 and target_rating is not None and target_rating > 0:
-            products_with_reviews += 1
-            total_reviews += review_count
-            
-            # Generate ratings
-            ratings = generate_ratings_with_average(review_count, target_rating)
-            product_id = extract_product_id(url)
-            
-            for j, r in enumerate(ratings, 1):
-                reviews.append({
-                    "product_id": product_id,
-                    "user_id": random.randint(1000, 99999),
-                    "buyerName": make_name(),
-                    "rating": r,
-                    "review_index": j,
-                })
-            
-            # Progress indicator
-            if i % 100 == 0:
-                print(f"[PROGRESS] Đã xử lý {i}/{len(products)} sản phẩm...")
-    
-    print(f"\n[INFO] Đã tạo {len(reviews)} reviews từ {products_with_reviews} sản phẩm")
-    
-    if not reviews:
-        print("[WARN] Không có review nào được tạo!")
-        return None
+    products = reviewable_products(products)
     
     # Tạo tên file output
     if not output_file:
         timestamp = int(time.time())
         output_file = f"reviews_{timestamp}.csv"
     
-    output_path = Path(output_file)
+    output_path = Path(with_compression_suffix(output_file, compression))
+    stem = _output_stem(output_path)
     
-    # Ghi file
-    fieldnames = ["product_id", "user_id", "buyerName", "rating", "review_index"]
-    with output_path.open("w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(reviews)
+    # Bảng users ghi một lần (chỉ khi có review), review chỉ tham chiếu user_id
+    users_path = Path(with_compression_suffix(output_path.with_name(f"{stem}_users.csv"), compression))
     
-    print(f"\n[SUCCESS] Đã lưu {len(reviews)} reviews vào: {output_path.name}")
+    if workers is not None:
+        shard_dir = output_path.with_name(f"{stem}_shards")
+        manifest = generate_review_shards(products, shard_dir, seed, workers=workers,
+                                          shard_products=shard_products, compression=compression,
+                                          chunk_rows=chunk_rows, n_users=n_users,
+                                          activity_exponent=activity_exponent,
+                                          users_file=users_path.name)
+        total_reviews = manifest["total_reviews"]
+        products_with_reviews = manifest["total_products"]
+        ratings_dist = {star: count for star, count in enumerate(manifest["rating_counts"]) if count}
+        print(f"\n[INFO] Đã tạo {total_reviews} reviews từ {products_with_reviews} sản phẩm")
+        
+        if not total_reviews:
+            print("[WARN] Không có review nào được tạo!")
+            return None
+        
+        print(f"\n[SUCCESS] Đã ghi {len(manifest['shards'])} shard vào: {shard_dir}")
+        if concat:
+            concat_review_files([shard_dir / s["file"] for s in manifest["shards"]], output_path)
+            print(f"[SUCCESS] Đã ghép shard vào: {output_path.name}")
+        result = output_path if concat else shard_dir / "manifest.json"
+    else:
+        # Generate fake reviews, ghi theo chunk
+        writer = ReviewStreamWriter(output_path, REVIEW_FIELDS, chunk_rows=chunk_rows)
+        cdf = activity_cdf(n_users, activity_exponent)
+        
+        try:
+            for i, p in enumerate(products.itertuples(index=False), 1):
+                _write_product_reviews(writer, p, seed, cdf)
+                
+                # Progress indicator
+                if i % 100 == 0:
+                    print(f"[PROGRESS] Đã xử lý {i}/{len(products)} sản phẩm...")
+        finally:
+            writer.close(remove_if_empty=True)
+        
+        total_reviews = writer.total_reviews
+        products_with_reviews = writer.products
+        ratings_dist = writer.rating_distribution()
+        print(f"\n[INFO] Đã tạo {total_reviews} reviews từ {products_with_reviews} sản phẩm")
+        
+        if not total_reviews:
+            print("[WARN] Không có review nào được tạo!")
+            return None
+        
+        print(f"\n[SUCCESS] Đã lưu {total_reviews} reviews vào: {output_path.name}")
+        result = output_path
+    
+    with open_text_output(users_path) as f:
+        build_users(n_users, FIRST_NAMES, LAST_NAMES, seed).to_csv(f, index=False)
+    print(f"[INFO] Đã ghi {n_users} users vào: {users_path.name}")
     
     # Thống kê
     print("\n[STATS] Thống kê reviews:")
-    print(f"  - Tổng reviews: {len(reviews)}")
+    print(f"  - Tổng reviews: {total_reviews}")
     print(f"  - Số sản phẩm có review: {products_with_reviews}")
-    print(f"  - TB reviews/sản phẩm: {len(reviews)/products_with_reviews:.1f}")
+    print(f"  - TB reviews/sản phẩm: {total_reviews/products_with_reviews:.1f}")
     
     # Rating distribution
-    ratings_dist = {}
-    for r in reviews:
-        rating_int = int(r['rating'])
-        ratings_dist[rating_int] = ratings_dist.get(rating_int, 0) + 1
-    
     print("\n  Phân bố rating:")
     for rating in sorted(ratings_dist.keys()):
         count = ratings_dist[rating]
-        pct = count / len(reviews) * 100
+        pct = count / total_reviews * 100
         print(f"    {rating} sao: {count} ({pct:.1f}%)")
     
-    return output_path
+    return result
+
+
+def _output_stem(output_path: Path) -> str:
+    """reviews_123.csv(.gz) -> reviews_123 (gốc tên cho _shards / _users.csv)"""
+    name = output_path.name
+    for suffix in [s for s in COMPRESSION_SUFFIXES.values() if s] + [".csv"]:
+        name = name.removesuffix(suffix)
+    return name
+
+
+def _generate_shard(products, path, seed, chunk_rows, n_users, activity_exponent):
+    """Worker: sinh reviews cho một shard sản phẩm, trả về thống kê của shard"""
+    cdf = activity_cdf(n_users, activity_exponent)
+    with ReviewStreamWriter(path, REVIEW_FIELDS, chunk_rows=chunk_rows) as writer:
+        for p in products.itertuples(index=False):
+            _write_product_reviews(writer, p, seed, cdf)
+    return {
+        "file": Path(path).name,
+        "products": writer.products,
+        "reviews": writer.total_reviews,
+        "rating_counts": writer.rating_counts.tolist(),
+    }
+
+
+def generate_review_shards(products, shard_dir, seed, workers=None,
+                           shard_products=DEFAULT_SHARD_PRODUCTS, compression=None,
+                           chunk_rows=DEFAULT_CHUNK_ROWS, n_users=DEFAULT_USERS,
+                           activity_exponent=DEFAULT_ACTIVITY_EXPONENT, users_file=None):
+    """
+    Sinh reviews song song: mỗi shard_products sản phẩm liên tiếp thành một file
+    part-NNNNN.csv trong shard_dir, rồi ghi manifest.json (thứ tự shard, số sản phẩm,
+    số review và phân bố rating của từng shard cùng tổng).
+    
+    Cách chia shard chỉ phụ thuộc shard_products, nên shard, manifest và file ghép
+    giống hệt nhau với mọi số worker.
+    """
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    
+    starts = range(0, len(products), shard_products)
+    paths = [
+        with_compression_suffix(shard_dir / f"part-{i:05d}.csv", compression)
+        for i in range(len(starts))
+    ]
+    shards = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            _generate_shard,
+            [products.iloc[s:s + shard_products] for s in starts],
+            paths,
+            repeat(seed),
+            repeat(chunk_rows),
+            repeat(n_users),
+            repeat(activity_exponent),
+        )
+        for i, shard in enumerate(results, 1):
+            shards.append(shard)
+            print(f"[PROGRESS] Xong shard {i}/{len(paths)}")
+    
+    rating_counts = np.zeros(6, dtype=np.int64)
+    for shard in shards:
+        rating_counts += shard["rating_counts"]
+    manifest = {
+        "seed": seed,
+        "fieldnames": REVIEW_FIELDS,
+        "compression": compression,
+        "users_file": users_file,
+        "n_users": n_users,
+        "activity_exponent": activity_exponent,
+        "shard_products": shard_products,
+        "total_products": sum(s["products"] for s in shards),
+        "total_reviews": sum(s["reviews"] for s in shards),
+        "rating_counts": rating_counts.tolist(),
+        "shards": shards,
+    }
+    with (shard_dir / "manifest.json").open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _write_product_reviews(writer, p, seed, cdf):
+    """Sinh reviews của một sản phẩm (một dòng của reviewable_products) và đưa vào writer
+
+    cdf: activity_cdf của bảng users, quyết định user nào viết review
+    """
+    review_count = int(p.so_review)
+    # Mọi thứ ngẫu nhiên của sản phẩm đều lấy từ stream riêng của nó
+    product_id = extract_product_id(p.url_san_pham)
+    rng = product_rng(seed, product_id)
+    ratings = generate_ratings_with_average(review_count, p.rating, rng)
+    user_ids = draw_user_ids(rng, review_count, cdf).tolist()
+    
+    rows = list(zip(repeat(product_id), user_ids, ratings, range(1, review_count + 1)))
+    writer.add_product(rows, ratings)
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Tạo fake reviews từ file CSV đã merge")
+    parser.add_argument("csv_file", nargs="?", help="File merged (bỏ trống để chọn)")
+    parser.add_argument("output_file", nargs="?", help="File output")
+    parser.add_argument("--seed", type=int, help="Seed để kết quả lặp lại được")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="Nén file output")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Số dòng mỗi lần ghi")
+    parser.add_argument("--workers", type=int, help="Sinh song song với N process, ghi shard + manifest")
+    parser.add_argument("--shard-products", type=int, default=DEFAULT_SHARD_PRODUCTS,
+                        help="Số sản phẩm mỗi shard")
+    parser.add_argument("--concat", action="store_true", help="Ghép các shard thành một file output")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="Số user trong bảng users")
+    parser.add_argument("--activity-exponent", type=float, default=DEFAULT_ACTIVITY_EXPONENT,
+                        help="Số mũ luật lũy thừa của độ hoạt động user (0 = đều)")
+    args = parser.parse_args()
+    options = dict(workers=args.workers, shard_products=args.shard_products, concat=args.concat,
+                    n_users=args.users, activity_exponent=args.activity_exponent)
     
-    if len(sys.argv) > 1:
+    if args.csv_file:
         # Run with argument
-        csv_file = sys.argv[1]
-        output_file = sys.argv[2] if len(sys.argv) > 2 else None
-        crawl_reviews_from_csv(csv_file, output_file)
+        crawl_reviews_from_csv(args.csv_file, args.output_file, seed=args.seed,
+                               compression=args.compress, chunk_rows=args.chunk_rows, **options)
     else:
         # Interactive mode
         print("CRAWL REVIEWS FROM MERGED CSV")
@@ -244,7 +338,9 @@ if __name__ == "__main__":
                 idx = int(choice) - 1
                 if 0 <= idx < len(merged_files):
                     csv_file = str(merged_files[idx])
-                    crawl_reviews_from_csv(csv_file)
+                    crawl_reviews_from_csv(csv_file, seed=args.seed,
+                                           compression=args.compress, chunk_rows=args.chunk_rows,
+                                           **options)
                 else:
                     print("[ERROR] Lựa chọn không hợp lệ!")
             except ValueError:
@@ -1,9 +1,13 @@
-import csv
 import random
 import time
-import re
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+
+import pandas as pd
+
+from product_store import is_parquet_path, product_id_from_url, read_review_source, reviewable_products
+from rating_engine import generate_ratings, product_rng
+from review_writer import DEFAULT_CHUNK_ROWS, ReviewStreamWriter, with_compression_suffix
 
 BASE_DIR = Path(__file__).resolve().parent
 CSV_PATTERN = "lazada_products_*.csv"
@@ -37,17 +41,23 @@ LAST_NAMES = [
 
 
 
-def collect_products() -> List[Dict[str, Any]]:
-    products: List[Dict[str, Any]] = []
-    for sub in BASE_DIR.iterdir():
-        if not sub.is_dir():
-            continue
-        for csv_path in sub.glob(CSV_PATTERN):
-            with csv_path.open(newline="", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    products.append(row)
-    return products
+REVIEW_FIELDS = ["product_id", "buyerName", "rating", "review_index"]
+
+
+def collect_products(source: Optional[str] = None) -> pd.DataFrame:
+    """rating / so_review / url_san_pham of every product, via product_store.read_review_source.
+
+    Column aliases are resolved once per file and only those three columns are read.
+    """
+    if source and is_parquet_path(source):
+        paths = [source]
+    else:
+        paths = [csv_path for sub in BASE_DIR.iterdir() if sub.is_dir() for csv_path in sub.glob(CSV_PATTERN)]
+
+    frames = [read_review_source(path) for path in paths]
+    if not frames:
+        return pd.DataFrame(columns=["url_san_pham", "so_review", "rating"])
+    return pd.concat(frames, ignore_index=True)
 
 
 def make_name() -> str:
@@ -58,128 +68,73 @@ def extract_product_id(url: str) -> str:
     
     if not url:
         return ""
-    match = re.search(r'-i(\d+)\.html', url)
-    if match:
-        return match.group(1)
-    return url  # Return original if pattern not found
-
-
-def generate_fake_reviews(products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    rows = []
-    for p in products:
-        rating = p.get("rating") or p.get("Rating")
-        review_count = p.get("so_review") or p.get("review_count")
-        url = p.get("url_san_pham") or p.get("url")
-        
-        # Skip if no URL
-        if not url:
-            continue
-            
-        try:
-            review_count = int(float(review_count)) if review_count else 0
-        except Exception:
-            review_count = 0
-        try:
-            target_rating = float(rating) if rating else None
-        except Exception:
-            target_rating = None
+    return product_id_from_url(url) or url  # Return original if pattern not found
 
+
+def iter_fake_reviews(products: pd.DataFrame, seed: Optional[int] = None) -> Iterator[Tuple[list, List[float]]]:
+    """Yield (rows, ratings) per product of a collect_products frame; rows are tuples in REVIEW_FIELDS order."""
+    # Only products with a URL, a valid rating and reviews get any
+    for p in reviewable_products(products).itertuples(index=False):
         # Generate exactly the same number of reviews as the product has
-        n_reviews = review_count
-        
-        # Only generate reviews if we have valid rating and review count
-        if n_reviews > 0 and target_rating is not None and target_rating > 0:
-            # Generate ratings that average to target_rating
-            ratings = generate_ratings_with_average(n_reviews, target_rating)
-            product_id = extract_product_id(url)
-            
-            for i in range(n_reviews):
-                rows.append({
-                    "product_id": product_id,
-                    "buyerName": make_name(),
-                    "rating": round(ratings[i], 2),  # Keep 2 decimals for accuracy
-                    "review_index": i + 1,
-                })
-    return rows
-
-
-def generate_ratings_with_average(n: int, target_avg: float) -> List[float]:
-    """Generate n ratings that average EXACTLY to target_avg."""
-    if n == 0:
-        return []
-    
-    # Clamp target between 1 and 5
-    target_avg = max(1.0, min(5.0, target_avg))
-    target_sum = target_avg * n
-    
-    # Generate n random integer ratings weighted toward target
-    ratings = []
-    for _ in range(n):
-        if target_avg >= 4.0:
-            # High rating: more 4s and 5s
-            rating = random.choices([1, 2, 3, 4, 5], weights=[1, 2, 5, 15, 25])[0]
-        elif target_avg >= 3.0:
-            # Medium-high rating: balanced distribution
-            rating = random.choices([1, 2, 3, 4, 5], weights=[3, 5, 15, 12, 8])[0]
-        else:
-            # Lower rating: more 1s, 2s, 3s
-            rating = random.choices([1, 2, 3, 4, 5], weights=[15, 12, 10, 5, 2])[0]
-        ratings.append(rating)
-    
-    # Adjust ratings to match exact target sum
-    current_sum = sum(ratings)
-    diff = target_sum - current_sum
-    
-    # Distribute the difference across ratings
-    if diff != 0:
-        # Sort indices by how much adjustment room they have
-        indices = list(range(n))
-        random.shuffle(indices)  # Randomize which ratings to adjust
-        
-        for idx in indices:
-            if abs(diff) < 0.01:  # Close enough
-                break
-            
-            # Calculate how much we can adjust this rating
-            if diff > 0:  # Need to increase
-                max_increase = 5.0 - ratings[idx]
-                increase = min(diff, max_increase)
-                ratings[idx] += increase
-                diff -= increase
-            else:  # Need to decrease
-                max_decrease = ratings[idx] - 1.0
-                decrease = min(abs(diff), max_decrease)
-                ratings[idx] -= decrease
-                diff += decrease
-    
-    # Convert to float and round to 2 decimals
-    ratings = [round(float(r), 2) for r in ratings]
-    
-    # Shuffle so adjusted ratings aren't clustered
-    random.shuffle(ratings)
-    
-    return ratings
+        n_reviews = int(p.so_review)
+
+        # Generate ratings that average to target_rating (per-product stream when seeded)
+        product_id = extract_product_id(p.url_san_pham)
+        rng = product_rng(seed, product_id) if seed is not None else None
+        ratings = generate_ratings_with_average(n_reviews, p.rating, rng)
+
+        # Ratings already carry 2 decimals
+        rows = [(product_id, make_name(), ratings[i], i + 1) for i in range(n_reviews)]
+        yield rows, ratings
+
+
+def generate_fake_reviews(products: pd.DataFrame, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """All reviews as dicts in memory; main() streams them instead."""
+    return [
+        dict(zip(REVIEW_FIELDS, row))
+        for rows, _ in iter_fake_reviews(products, seed=seed)
+        for row in rows
+    ]
 
 
-def main():
-    products = collect_products()
-    if not products:
+def generate_ratings_with_average(n: int, target_avg: float, rng=None) -> List[float]:
+    """Generate n ratings that average EXACTLY to target_avg (see rating_engine)."""
+    return generate_ratings(n, target_avg, rng).tolist()
+
+
+def main(source: Optional[str] = None, seed: Optional[int] = None, compression: Optional[str] = None,
+         chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    if seed is not None:
+        random.seed(seed)
+    products = collect_products(source)
+    if products.empty:
         print("Không tìm thấy dữ liệu sản phẩm.")
         return
 
-    fake_rows = generate_fake_reviews(products)
-    if not fake_rows:
+    # Stream product by product: memory stays bounded whatever the total review count
+    output = with_compression_suffix(OUTPUT, compression)
+    writer = ReviewStreamWriter(output, REVIEW_FIELDS, chunk_rows=chunk_rows)
+    try:
+        for rows, ratings in iter_fake_reviews(products, seed=seed):
+            writer.add_product(rows, ratings)
+    finally:
+        writer.close(remove_if_empty=True)
+
+    if not writer.total_reviews:
         print("Không tạo được fake review.")
         return
 
-    fieldnames = ["product_id", "buyerName", "rating", "review_index"]
-    with OUTPUT.open("w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(fake_rows)
-
-    print(f"Đã tạo {len(fake_rows)} reviews → {OUTPUT}")
+    print(f"Đã tạo {writer.total_reviews} reviews → {output}")
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate fake reviews for the crawled products.")
+    parser.add_argument("source", nargs="?", help="Parquet store to read instead of the category CSV folders")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible output")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="Compress the output file")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per write")
+    args = parser.parse_args()
+
+    main(args.source, seed=args.seed, compression=args.compress, chunk_rows=args.chunk_rows)
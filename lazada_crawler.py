@@ -1,122 +1,709 @@
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
+from catalog_cache import DEFAULT_CACHE_DIR, CatalogCache
+from crawl_delta import DEFAULT_STORE_PATH, EVENT_FIELDS, FingerprintStore
+from crawl_journal import CrawlJournal
+from crawl_metrics import CrawlMetrics
+from product_store import PRODUCT_FIELDS, save_to_parquet
+from collections import deque
+from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import importlib.util
 import time
 import csv
+import json
 import os
+import random
 import re
+import sys
 
 
-def crawl_lazada(keyword="shirts", start_page=1, end_page=10):
+try:
+    import httpx
+except ImportError:  # only needed for backend="http"
+    httpx = None
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+LAZADA_BASE_URL = os.environ.get("LAZADA_BASE_URL", "https://www.lazada.vn")
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+
+CATALOG_HEADERS = {
+    "accept": "application/json, text/plain, */*",
+    "x-requested-with": "XMLHttpRequest",
+    "referer": "https://www.lazada.vn/",
+}
+
+
+def _catalog_params(keyword, page):
+    return {
+        "ajax": "true",
+        "_keyori": "ss",
+        "from": "input",
+        "page": page,
+        "q": keyword,
+    }
+
+
+def _is_captcha(body):
+    # Lazada's anti-bot answer is a small JSON/HTML body pointing at its "punish" slider page.
+    return b"rgv587_flag" in body or b"/punish" in body or b"FAIL_SYS_USER_VALIDATE" in body
+
+
+def _retry_reason(status, content_type, body):
+    """Why a response is worth retrying, or None if it is final (success or permanent failure)."""
+    if status is None:
+        return "request error"
+    if status == 429:
+        return "throttled (429)"
+    if status >= 500:
+        return f"server error ({status})"
+    if status == 200 and (_is_captcha(body) or "application/json" not in content_type):
+        return "captcha / non-JSON body"
+    return None
+
+
+def _last_page(data):
+    """Real last page from mainInfo.totalResults / pageSize, or None if the payload lacks them."""
+    info = data.get("mainInfo") or {}
+    try:
+        total = int(info.get("totalResults"))
+        page_size = int(info.get("pageSize"))
+    except (TypeError, ValueError):
+        return None
+    if page_size <= 0:
+        return None
+    return max(1, -(-total // page_size))
+
+
+def _parse_catalog_response(status, content_type, body, page_no):
+    """Return the decoded catalog payload, or None if the page should be skipped."""
+    if status is None:
+        # Transport error, already reported by the fetch loop.
+        return None
+
+    if status != 200:
+        print(f"⚠️ Request failed with status {status} for page {page_no}")
+        return None
+
+    if "application/json" not in content_type:
+        print(f"⚠️ Unexpected content-type {content_type or 'unknown'} for page {page_no} (status {status})")
+        return None
+
+    if _is_captcha(body):
+        print(f"⚠️ Captcha challenge returned for page {page_no}")
+        return None
+
+    try:
+        return json.loads(body)
+    except Exception as exc:
+        print(f"⚠️ Failed to parse catalog response for page {page_no}: {exc}")
+        return None
+
+
+def _map_items(data, category_value, page_no):
+    items = []
+
+    for p_item in data.get("mods", {}).get("listItems", []):
+        raw_url = (
+            p_item.get("productUrl")
+            or p_item.get("itemUrl")
+            or p_item.get("itemUrlWrap")
+            or p_item.get("itemUrlPC")
+        )
+
+        if raw_url:
+            if raw_url.startswith("//"):
+                raw_url = "https:" + raw_url
+            elif raw_url.startswith("/"):
+                raw_url = "https://www.lazada.vn" + raw_url
+        else:
+            # Expose missing URL so we know to adjust mapping if Lazada changes payload keys again.
+            nid = p_item.get("nid") or p_item.get("itemId")
+            print(f"⚠️ Missing product URL for item {nid or '[unknown id]'} on page {page_no}")
+
+        items.append({
+            "ten_san_pham": p_item.get("name"),
+            "gia_sale": p_item.get("price"),
+            "gia_goc": p_item.get("originalPrice"),
+            "rating": p_item.get("ratingScore"),
+            "so_review": p_item.get("review"),
+            "link_anh": p_item.get("image"),
+            "shop": p_item.get("sellerName"),
+            "category": category_value,
+            "url_san_pham": raw_url,
+        })
+
+    return items
+
+
+class TokenBucket:
+    """Async token bucket: at most `rate` requests/second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RetryPolicy:
+    """Bounded exponential backoff with full jitter and a crawl-wide retry budget.
+
+    A page gets at most `max_retries` extra attempts, waiting a random time in
+    [0, min(max_delay, base_delay * 2**attempt)] before each one. `budget` caps the
+    retries of the whole crawl so a hard block does not stall every remaining page.
+    """
+
+    def __init__(self, max_retries=4, base_delay=1.0, max_delay=30.0, budget=50):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def allow(self, attempt):
+        if attempt >= self.max_retries or self.budget <= 0:
+            return False
+        self.budget -= 1
+        return True
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def _fetch_with_retry(context, base_url, keyword, page_no, retry, metrics=None):
+    attempt = 0
+    while True:
+        error = None
+        started = time.monotonic()
+        try:
+            response = context.request.get(
+                base_url + "/catalog/",
+                params=_catalog_params(keyword, page_no),
+                headers=CATALOG_HEADERS,
+                timeout=60_000,
+            )
+            status = response.status
+            content_type = (response.headers.get("content-type") or "").lower()
+            body = response.body()
+        except Exception as exc:
+            status, content_type, body, error = None, "", b"", exc
+        if metrics:
+            metrics.observe_request(time.monotonic() - started, status, content_type, len(body))
+
+        reason = _retry_reason(status, content_type, body)
+        if reason is None or not retry.allow(attempt):
+            if error is not None:
+                print(f"⚠️ Request error for page {page_no}: {error}")
+            return status, content_type, body
+
+        delay = retry.delay(attempt)
+        print(f"🔁 Page {page_no}: {reason}, retrying in {delay:.1f}s")
+        if metrics:
+            metrics.observe_retry(reason)
+            metrics.observe_wait("backoff", delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+async def _fetch_with_retry_async(fetch, keyword, page_no, limiter, retry, metrics=None):
+    attempt = 0
+    while True:
+        waited = time.monotonic()
+        await limiter.acquire()
+        if metrics:
+            metrics.observe_wait("rate_limit", time.monotonic() - waited)
+        if attempt == 0:
+            print(f"👉 Crawling page {page_no}")
+
+        error = None
+        started = time.monotonic()
+        try:
+            status, content_type, body = await fetch(keyword, page_no)
+        except Exception as exc:
+            status, content_type, body, error = None, "", b"", exc
+        if metrics:
+            metrics.observe_request(time.monotonic() - started, status, content_type, len(body))
+
+        reason = _retry_reason(status, content_type, body)
+        if reason is None or not retry.allow(attempt):
+            if error is not None:
+                print(f"⚠️ Request error for page {page_no}: {error}")
+            return status, content_type, body
+
+        delay = retry.delay(attempt)
+        print(f"🔁 Page {page_no}: {reason}, retrying in {delay:.1f}s")
+        if metrics:
+            metrics.observe_retry(reason)
+            metrics.observe_wait("backoff", delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def default_journal_path(keyword):
+    return os.path.join(_slugify_keyword(keyword), ".crawl_journal.jsonl")
+
+
+def replay_lazada(keyword="shirts", start_page=1, end_page=10, cache=None):
+    """Rebuild items purely from cached catalog bodies; never touches the network."""
+    cache = cache or CatalogCache()
     results = []
     category_value = keyword.strip() or keyword
 
+    for i in range(start_page, end_page + 1):
+        body = cache.get(keyword, i, ignore_ttl=True)
+        if body is None:
+            print(f"⚠️ Page {i} is not in the cache, skipping")
+            continue
+
+        data = _parse_catalog_response(200, "application/json", body, i)
+        if data is not None:
+            results.extend(_map_items(data, category_value, i))
+
+    return results
+
+
+def crawl_lazada(keyword="shirts", start_page=1, end_page=10, mode="sync",
+                 concurrency=4, rate=2.0, base_url=LAZADA_BASE_URL, headless=False,
+                 journal=None, cache=None, backend="playwright", cookies_file=None, stream=False,
+                 retry=None, metrics=None):
+    if stream:
+        # Streaming is the sequential Playwright path only; callers iterate (page_no, items).
+        if mode != "sync" or backend != "playwright":
+            raise ValueError("stream=True requires mode='sync' and backend='playwright'")
+        return iter_lazada(keyword, start_page, end_page, base_url=base_url, headless=headless,
+                           journal=journal, cache=cache, retry=retry, metrics=metrics)
+    if mode == "replay":
+        return replay_lazada(keyword, start_page, end_page, cache=cache)
+    if backend == "http" and mode == "sync":
+        # The HTTP client is async-only; one in-flight request at 1 req/s mirrors the sequential pacing.
+        mode, concurrency, rate = "async", 1, 1.0
+    if mode == "async":
+        return asyncio.run(crawl_lazada_async(
+            keyword, start_page, end_page,
+            concurrency=concurrency, rate=rate, base_url=base_url, headless=headless,
+            journal=journal, cache=cache, backend=backend, cookies_file=cookies_file, retry=retry,
+            metrics=metrics,
+        ))
+    if mode != "sync":
+        raise ValueError(f"Unknown crawl mode: {mode!r}")
+    if backend != "playwright":
+        raise ValueError(f"Unknown crawl backend: {backend!r}")
+
+    return [item for _, items in iter_lazada(
+        keyword, start_page, end_page,
+        base_url=base_url, headless=headless, journal=journal, cache=cache, retry=retry,
+        metrics=metrics,
+    ) for item in items]
+
+
+def iter_lazada(keyword="shirts", start_page=1, end_page=10, base_url=LAZADA_BASE_URL, headless=False,
+                journal=None, cache=None, retry=None, metrics=None):
+    """Sequential crawl that yields (page_no, items) as soon as each page is done.
+
+    Pages already in `journal` are yielded from it without a request, so the stream
+    always covers the whole range in page order. The crawl stops early at the real
+    last page (from mainInfo.totalResults) or at the first page with no listItems.
+    """
+    category_value = keyword.strip() or keyword
+    retry = retry or RetryPolicy()
+    last_page = end_page
+
+    done = journal.completed_pages(keyword) if journal else set()
+    if journal and journal.last_page(keyword):
+        # An earlier run already found the real last page
+        last_page = min(last_page, journal.last_page(keyword))
+    pending = [i for i in range(start_page, last_page + 1) if i not in done]
+    skipped = sum(1 for i in range(start_page, end_page + 1) if i in done)
+    if skipped:
+        print(f"↩️ Bỏ qua {skipped} trang đã có trong journal, còn {len(pending)} trang")
+    if not pending:
+        for i in range(start_page, end_page + 1):
+            yield i, journal.items(keyword, i, i)
+        return
+
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                       "AppleWebKit/537.36 (KHTML, like Gecko) "
-                       "Chrome/120.0.0.0 Safari/537.36"
-        )
+        browser = p.chromium.launch(headless=headless)
+        context = browser.new_context(user_agent=USER_AGENT)
         page = context.new_page()
 
         # Hit homepage once to obtain baseline cookies before calling the JSON endpoint directly.
         try:
-            page.goto("https://www.lazada.vn/", wait_until="domcontentloaded", timeout=30000)
+            page.goto(base_url + "/", wait_until="domcontentloaded", timeout=30000)
             time.sleep(2)  # Wait for additional resources to load
+            if metrics:
+                metrics.observe_wait("sleep", 2)
         except Exception as e:
             print(f"⚠️ Warning: Failed to load homepage, continuing anyway: {e}")
 
-        headers = {
-            "accept": "application/json, text/plain, */*",
-            "x-requested-with": "XMLHttpRequest",
-            "referer": "https://www.lazada.vn/",
-        }
+        try:
+            for i in range(start_page, end_page + 1):
+                if i > last_page:
+                    print(f"🏁 Reached the last page ({last_page}), stopping")
+                    break
 
-        for i in range(start_page, end_page + 1):
-            print(f"👉 Crawling page {i}")
+                if i in done:
+                    yield i, journal.items(keyword, i, i)
+                    continue
 
-            response = context.request.get(
-                "https://www.lazada.vn/catalog/",
-                params={
-                    "ajax": "true",
-                    "_keyori": "ss",
-                    "from": "input",
-                    "page": i,
-                    "q": keyword,
-                },
-                headers=headers,
+                print(f"👉 Crawling page {i}")
+
+                body = cache.get(keyword, i) if cache else None
+                from_cache = body is not None
+                if from_cache:
+                    status, content_type = 200, "application/json"
+                else:
+                    status, content_type, body = _fetch_with_retry(context, base_url, keyword, i, retry, metrics)
+
+                items = []
+                data = _parse_catalog_response(status, content_type, body, i)
+                if data is not None:
+                    items = _map_items(data, category_value, i)
+                    real_last_page = i if not items else _last_page(data)
+                    if journal:
+                        journal.record(keyword, i, items, last_page=real_last_page)
+                    if cache and not from_cache:
+                        cache.put(keyword, i, body)
+
+                    if real_last_page:
+                        last_page = min(last_page, real_last_page)
+                if metrics:
+                    metrics.observe_page(len(items), from_cache)
+
+                if not from_cache:
+                    time.sleep(1)
+                    if metrics:
+                        metrics.observe_wait("sleep", 1)
+
+                yield i, items
+        finally:
+            browser.close()
+
+
+async def _open_async_context(p, base_url, headless):
+    browser = await p.chromium.launch(headless=headless)
+    context = await browser.new_context(user_agent=USER_AGENT)
+    page = await context.new_page()
+
+    # Same cookie warm-up as the sync path; the page is closed afterwards since only
+    # context.request is used for the catalog calls.
+    try:
+        await page.goto(base_url + "/", wait_until="domcontentloaded", timeout=30000)
+        await asyncio.sleep(2)
+    except Exception as e:
+        print(f"⚠️ Warning: Failed to load homepage, continuing anyway: {e}")
+    await page.close()
+
+    return browser, context
+
+
+def load_cookies(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    # Accept both a bare cookie list and Playwright's storage_state() layout.
+    return data["cookies"] if isinstance(data, dict) else data
+
+
+async def warm_up_cookies(base_url=LAZADA_BASE_URL, headless=False, save_to=None):
+    """Launch Chromium once, load the homepage and return (optionally save) its cookies."""
+    async with async_playwright() as p:
+        browser, context = await _open_async_context(p, base_url, headless)
+        try:
+            cookies = await context.cookies()
+        finally:
+            await browser.close()
+
+    if save_to:
+        with open(save_to, "w", encoding="utf-8") as f:
+            json.dump(cookies, f, ensure_ascii=False, indent=2)
+    return cookies
+
+
+@asynccontextmanager
+async def _playwright_fetcher(base_url, headless):
+    async with async_playwright() as p:
+        browser, context = await _open_async_context(p, base_url, headless)
+
+        async def fetch(keyword, page_no):
+            response = await context.request.get(
+                base_url + "/catalog/",
+                params=_catalog_params(keyword, page_no),
+                headers=CATALOG_HEADERS,
                 timeout=60_000,
             )
+            body = await response.body()
+            return response.status, (response.headers.get("content-type") or "").lower(), body
 
-            status = response.status
-            content_type = (response.headers.get("content-type") or "").lower()
+        try:
+            yield fetch
+        finally:
+            await browser.close()
+
+
+@asynccontextmanager
+async def _http_fetcher(base_url, headless, concurrency, cookies_file):
+    if httpx is None:
+        raise RuntimeError("backend='http' cần httpx: pip install 'httpx[http2]'")
+
+    if cookies_file and os.path.exists(cookies_file):
+        cookies = load_cookies(cookies_file)
+    else:
+        cookies = await warm_up_cookies(base_url, headless, save_to=cookies_file)
+
+    jar = httpx.Cookies()
+    for cookie in cookies:
+        jar.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"user-agent": USER_AGENT, **CATALOG_HEADERS}
 
-            if status != 200:
-                print(f"⚠️ Request failed with status {status} for page {i}")
-                time.sleep(1)
-                continue
+    async with httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=limits, cookies=jar,
+                                 headers=headers, timeout=60.0) as client:
+        async def fetch(keyword, page_no):
+            response = await client.get(base_url + "/catalog/", params=_catalog_params(keyword, page_no))
+            return response.status_code, (response.headers.get("content-type") or "").lower(), response.content
 
-            if "application/json" not in content_type:
-                print(f"⚠️ Unexpected content-type {content_type or 'unknown'} for page {i} (status {status})")
-                time.sleep(1)
-                continue
+        yield fetch
 
+
+def _open_fetcher(backend, base_url, headless, concurrency, cookies_file):
+    if backend == "playwright":
+        return _playwright_fetcher(base_url, headless)
+    if backend == "http":
+        return _http_fetcher(base_url, headless, max(1, concurrency), cookies_file)
+    raise ValueError(f"Unknown crawl backend: {backend!r}")
+
+
+async def _crawl_page_async(fetch, keyword, page_no, semaphore, limiter, retry, last_pages,
+                            journal=None, cache=None, metrics=None):
+    category_value = keyword.strip() or keyword
+
+    body = cache.get(keyword, page_no) if cache else None
+    from_cache = body is not None
+    if from_cache:
+        status, content_type = 200, "application/json"
+    else:
+        async with semaphore:
+            # Another page of this keyword may have revealed the last page while we queued.
+            if page_no > last_pages[keyword]:
+                return []
+            status, content_type, body = await _fetch_with_retry_async(
+                fetch, keyword, page_no, limiter, retry, metrics,
+            )
+
+    data = _parse_catalog_response(status, content_type, body, page_no)
+    if data is None:
+        if metrics:
+            metrics.observe_page(0, from_cache)
+        return []
+
+    items = _map_items(data, category_value, page_no)
+    if metrics:
+        metrics.observe_page(len(items), from_cache)
+    real_last_page = page_no if not items else _last_page(data)
+    if real_last_page:
+        last_pages[keyword] = min(last_pages[keyword], real_last_page)
+    if journal:
+        journal.record(keyword, page_no, items, last_page=real_last_page)
+    if cache and not from_cache:
+        cache.put(keyword, page_no, body)
+    return items
+
+
+async def crawl_lazada_async(keyword="shirts", start_page=1, end_page=10, concurrency=4,
+                             rate=2.0, base_url=LAZADA_BASE_URL, headless=False, journal=None,
+                             cache=None, backend="playwright", cookies_file=None, retry=None, metrics=None):
+    """Fetch catalog pages concurrently; items come back in page order like crawl_lazada."""
+    results = await crawl_many_async(
+        [(keyword, start_page, end_page)],
+        concurrency=concurrency, rate=rate, base_url=base_url, headless=headless,
+        journal=journal, cache=cache, backend=backend, cookies_file=cookies_file, retry=retry,
+        metrics=metrics,
+    )
+    return results[keyword]
+
+
+async def crawl_many_async(jobs, concurrency=4, rate=2.0, base_url=LAZADA_BASE_URL, headless=False,
+                           journal=None, cache=None, backend="playwright", cookies_file=None,
+                           on_page=None, retry=None, metrics=None):
+    """Crawl (keyword, start_page, end_page) jobs in one browser context; {keyword: items}, or None with on_page."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    limiter = TokenBucket(rate)
+    retry = retry or RetryPolicy()
+    last_pages = {}
+    for keyword, _, end_page in jobs:
+        last_pages[keyword] = max(last_pages.get(keyword, end_page), end_page)
+    if journal:
+        # Resume: an earlier run may already have found a keyword's real last page
+        for keyword in last_pages:
+            if journal.last_page(keyword):
+                last_pages[keyword] = min(last_pages[keyword], journal.last_page(keyword))
+
+    pending_jobs = []
+    for keyword, start_page, end_page in jobs:
+        done = journal.completed_pages(keyword) if journal else set()
+        pending = [i for i in range(start_page, min(end_page, last_pages[keyword]) + 1) if i not in done]
+        skipped = sum(1 for i in range(start_page, end_page + 1) if i in done)
+        if skipped:
+            print(f"↩️ {keyword}: bỏ qua {skipped} trang đã có trong journal, còn {len(pending)} trang")
+        pending_jobs.append(pending)
+
+    per_job = [{} for _ in jobs]
+    if any(pending_jobs):
+        # Pages are started in consumption order and at most `window` run ahead of the
+        # consumer, so finished-but-unconsumed pages stay bounded while the semaphore
+        # is kept busy.
+        queue = deque((j, i) for j, pending in enumerate(pending_jobs) for i in pending)
+        window = max(1, concurrency) * 2
+        tasks = {}
+        async with _open_fetcher(backend, base_url, headless, concurrency, cookies_file) as fetch:
             try:
-                data = response.json()
-            except Exception as exc:
-                print(f"⚠️ Failed to parse catalog response for page {i}: {exc}")
-                time.sleep(1)
-                continue
-
-            items = data.get("mods", {}).get("listItems", [])
-
-            for p_item in items:
-                raw_url = (
-                    p_item.get("productUrl")
-                    or p_item.get("itemUrl")
-                    or p_item.get("itemUrlWrap")
-                    or p_item.get("itemUrlPC")
-                )
-
-                if raw_url:
-                    if raw_url.startswith("//"):
-                        raw_url = "https:" + raw_url
-                    elif raw_url.startswith("/"):
-                        raw_url = "https://www.lazada.vn" + raw_url
-                else:
-                    # Expose missing URL so we know to adjust mapping if Lazada changes payload keys again.
-                    nid = p_item.get("nid") or p_item.get("itemId")
-                    print(f"⚠️ Missing product URL for item {nid or '[unknown id]'} on page {i}")
-
-                results.append({
-                    "ten_san_pham": p_item.get("name"),
-                    "gia_sale": p_item.get("price"),
-                    "gia_goc": p_item.get("originalPrice"),
-                    "rating": p_item.get("ratingScore"),
-                    "so_review": p_item.get("review"),
-                    "link_anh": p_item.get("image"),
-                    "shop": p_item.get("sellerName"),
-                    "category": category_value,
-                    "url_san_pham": raw_url,
-                })
-
-            time.sleep(1)
-
-        browser.close()
+                for j, ((keyword, start_page, end_page), pages) in enumerate(zip(jobs, per_job)):
+                    for i in range(start_page, end_page + 1):
+                        while queue and len(tasks) < window:
+                            unit = queue.popleft()
+                            tasks[unit] = asyncio.create_task(_crawl_page_async(
+                                fetch, jobs[unit[0]][0], unit[1], semaphore, limiter, retry, last_pages,
+                                journal, cache, metrics,
+                            ))
+                        if (j, i) in tasks:
+                            # pop: a finished task would otherwise keep its items alive
+                            items = await tasks.pop((j, i))
+                        elif on_page:
+                            items = journal.items(keyword, i, i)
+                        else:
+                            continue
+                        if on_page:
+                            on_page(keyword, i, items)
+                        else:
+                            pages[i] = items
+            finally:
+                for task in tasks.values():
+                    task.cancel()
+    elif on_page:
+        for keyword, start_page, end_page in jobs:
+            for i in range(start_page, end_page + 1):
+                on_page(keyword, i, journal.items(keyword, i, i))
+
+    if on_page:
+        return None
 
+    results = {}
+    for (keyword, start_page, end_page), pages in zip(jobs, per_job):
+        if journal:
+            items = journal.items(keyword, start_page, end_page)
+        else:
+            items = [item for i in sorted(pages) for item in pages[i]]
+        results.setdefault(keyword, []).extend(items)
     return results
 
 
+def crawl_batch(jobs, concurrency=4, rate=2.0, base_url=LAZADA_BASE_URL, headless=False, journal=None,
+                cache=None, replay=False, backend="playwright", cookies_file=None, stream=False,
+                retry=None, delta=None, snapshot=True, detect_removed=False, output_format="csv",
+                metrics=None):
+    """Crawl all jobs in one browser session; returns {keyword: path(s)} from save_products / save_delta."""
+    if output_format not in ("csv", "parquet", "both"):
+        raise ValueError(f"Unknown output format: {output_format!r}")
+    if stream and delta:
+        raise ValueError("delta mode needs the full snapshot and cannot be combined with stream=True")
+    if stream and output_format != "csv":
+        raise ValueError("stream=True writes CSV page by page and cannot be combined with output_format="
+                         f"{output_format!r}")
+
+    if stream and not replay:
+        writers = {}
+
+        def on_page(keyword, page_no, items):
+            if keyword not in writers:
+                writers[keyword] = CsvStreamWriter(keyword)
+            writers[keyword].write_page(items)
+
+        try:
+            asyncio.run(crawl_many_async(
+                jobs, concurrency=concurrency, rate=rate, base_url=base_url, headless=headless,
+                journal=journal, cache=cache, backend=backend, cookies_file=cookies_file,
+                on_page=on_page, retry=retry, metrics=metrics,
+            ))
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        saved = {}
+        for keyword, writer in writers.items():
+            print(f"✅ {keyword}: {writer.rows} sản phẩm")
+            saved[keyword] = writer.path
+        return saved
+
+    if replay:
+        results = {}
+        for keyword, start_page, end_page in jobs:
+            results.setdefault(keyword, []).extend(replay_lazada(keyword, start_page, end_page, cache=cache))
+    else:
+        results = asyncio.run(crawl_many_async(
+            jobs, concurrency=concurrency, rate=rate, base_url=base_url, headless=headless,
+            journal=journal, cache=cache, backend=backend, cookies_file=cookies_file, retry=retry,
+            metrics=metrics,
+        ))
+
+    saved = {}
+    for keyword, data in results.items():
+        print(f"✅ {keyword}: {len(data)} sản phẩm")
+        if delta:
+            saved[keyword] = save_delta(data, keyword, delta, snapshot=snapshot,
+                                        detect_removed=detect_removed, output_format=output_format)
+        else:
+            saved[keyword] = save_products(data, keyword, output_format)
+    return saved
+
+
+def _flat_paths(paths):
+    # crawl_batch values: a path, (csv, parquet) for "both", (products, changes) in delta mode
+    if isinstance(paths, tuple):
+        for path in paths:
+            yield from _flat_paths(path)
+    elif paths:
+        yield paths
+
+
+def _parse_job(spec, default_start, default_end):
+    # "shirts" -> default range, "shirts:3" -> page 3, "shirts:1-20" -> pages 1..20
+    keyword, _, pages = spec.partition(":")
+    start_page, end_page = default_start, default_end
+    if pages:
+        first, _, last = pages.partition("-")
+        start_page = int(first)
+        end_page = int(last) if last else start_page
+    if end_page < start_page:
+        raise ValueError(f"Invalid page range in {spec!r}")
+    return keyword.strip(), start_page, end_page
+
+
 def _slugify_keyword(keyword: str) -> str:
     slug = re.sub(r"[^a-z0-9_-]+", "_", keyword.strip().lower())
     slug = slug.strip("_")
     return slug or "keyword"
 
 
-def save_to_csv(data, keyword, filename=None):
-    if not data:
-        print("⚠️ Không có dữ liệu để lưu.")
-        return None
-
+def _output_path(keyword, filename=None):
     keyword_slug = _slugify_keyword(keyword)
     folder = keyword_slug
     os.makedirs(folder, exist_ok=True)
@@ -125,7 +712,15 @@ def save_to_csv(data, keyword, filename=None):
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         filename = f"lazada_products_{keyword_slug}_{timestamp}.csv"
 
-    filepath = os.path.join(folder, filename)
+    return os.path.join(folder, filename)
+
+
+def save_to_csv(data, keyword, filename=None):
+    if not data:
+        print("⚠️ Không có dữ liệu để lưu.")
+        return None
+
+    filepath = _output_path(keyword, filename)
 
     with open(filepath, "w", newline="", encoding="utf-8-sig") as f:
         writer = csv.DictWriter(f, fieldnames=data[0].keys())
@@ -135,7 +730,103 @@ def save_to_csv(data, keyword, filename=None):
     return filepath
 
 
-if __name__ == "__main__":
+def save_products(data, keyword, output_format="csv"):
+    """Write one keyword's items as CSV, Parquet, or both; "both" returns (csv_path, parquet_path)."""
+    if output_format == "csv":
+        return save_to_csv(data, keyword)
+    if output_format == "parquet":
+        return save_to_parquet(data, keyword)
+    if output_format == "both":
+        return save_to_csv(data, keyword), save_to_parquet(data, keyword)
+    raise ValueError(f"Unknown output format: {output_format!r}")
+
+
+def save_delta(data, keyword, store, snapshot=True, detect_removed=False, output_format="csv"):
+    """Diff `data` against the fingerprint store and write the change events.
+
+    detect_removed=True also reports (and forgets) stored items missing from `data`;
+    only use it when `data` is the keyword's full catalog, otherwise any page outside
+    the range or lost to errors shows up as removed.
+
+    Events go to <slug>/lazada_changes_<slug>_<timestamp>.csv. With snapshot=True the
+    full product CSV is written as usual; with snapshot=False the products CSV only
+    holds new and changed rows, so merge/import only touch what moved. The products
+    are written in `output_format` (see save_products); events are always CSV.
+    Returns (products_path, changes_path).
+    """
+    events = store.apply(keyword, data, detect_removed=detect_removed)
+    counts = {}
+    for event in events:
+        counts[event["change_type"]] = counts.get(event["change_type"], 0) + 1
+    print(f"🔀 {keyword}: {counts.get('new', 0)} mới, {counts.get('changed', 0)} thay đổi, "
+          f"{counts.get('removed', 0)} biến mất")
+
+    changes_path = None
+    if events:
+        keyword_slug = _slugify_keyword(keyword)
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        changes_path = _output_path(keyword, f"lazada_changes_{keyword_slug}_{timestamp}.csv")
+        with open(changes_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=EVENT_FIELDS + PRODUCT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(events)
+
+    if not snapshot:
+        data = [
+            {field: event.get(field) for field in PRODUCT_FIELDS}
+            for event in events
+            if event["change_type"] != "removed"
+        ]
+    return save_products(data, keyword, output_format), changes_path
+
+
+class CsvStreamWriter:
+    """Per-keyword CSV with a fixed PRODUCT_FIELDS header, appended and flushed one page at a time.
+
+    The file is readable (header + finished pages) while the crawl is still running.
+    An output that never received a row is removed on close, like save_to_csv refusing
+    to write empty data.
+    """
+
+    def __init__(self, keyword, filename=None):
+        self.path = _output_path(keyword, filename)
+        self.rows = 0
+        self._file = open(self.path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._file, fieldnames=PRODUCT_FIELDS, extrasaction="ignore")
+        self._writer.writeheader()
+        self._file.flush()
+
+    def write_page(self, items):
+        if items:
+            self._writer.writerows(items)
+            self._file.flush()
+            self.rows += len(items)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if not self.rows:
+            print("⚠️ Không có dữ liệu để lưu.")
+            os.remove(self.path)
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_stream_to_csv(pages, keyword, filename=None):
+    """Consume (page_no, items) pairs, e.g. from iter_lazada, into a streaming CSV."""
+    with CsvStreamWriter(keyword, filename) as writer:
+        for _, items in pages:
+            writer.write_page(items)
+    return writer.path
+
+
+def _interactive_main():
     keyword = input("Nhập từ khóa (mặc định 'shirts'): ").strip() or "shirts"
 
     try:
@@ -149,8 +840,98 @@ if __name__ == "__main__":
         print("⚠️ Trang kết thúc phải >= trang bắt đầu. Đổi về cùng giá trị.")
         end_page = start_page
 
-    data = crawl_lazada(keyword, start_page, end_page)
+    try:
+        concurrency = int(input("Số trang tải song song (mặc định 1 = tuần tự): ").strip() or "1")
+    except ValueError:
+        concurrency = 1
+
+    resume = input("Tiếp tục từ journal của lần chạy trước? (y/N): ").strip().lower() == "y"
+    journal = CrawlJournal(default_journal_path(keyword), resume=resume)
+
+    mode = "async" if concurrency > 1 else "sync"
+    data = crawl_lazada(keyword, start_page, end_page, mode=mode, concurrency=concurrency, journal=journal)
     print(f"\n✅ Tổng sản phẩm lấy được: {len(data)}")
     saved = save_to_csv(data, keyword)
     if saved:
         print(f"📁 Đã lưu file {saved}")
+
+
+def _batch_main(argv):
+    parser = argparse.ArgumentParser(
+        description="Crawl nhiều keyword trong cùng một phiên trình duyệt.",
+    )
+    parser.add_argument("jobs", nargs="+", help="keyword[:start-end], ví dụ shirts:1-10 jeans")
+    parser.add_argument("--pages", default="1-10", help="Khoảng trang mặc định (mặc định 1-10)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="Số request/giây tối đa")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--journal", default=".crawl_journal.jsonl", help="File journal theo từng trang")
+    parser.add_argument("--resume", action="store_true",
+                        help="Bỏ qua các trang đã có trong journal và dựng lại CSV từ journal")
+    parser.add_argument("--cache", default=None, metavar="DIR",
+                        help="Lưu response JSON thô vào cache nén (vd .lazada_cache)")
+    parser.add_argument("--cache-ttl", type=float, default=24.0, help="Thời hạn cache tính bằng giờ")
+    parser.add_argument("--replay", action="store_true",
+                        help="Chỉ đọc từ cache, không gọi mạng (dùng để map lại item)")
+    parser.add_argument("--backend", choices=["playwright", "http"], default="playwright",
+                        help="http: chỉ dùng Chromium lấy cookie, còn lại gọi qua httpx keep-alive")
+    parser.add_argument("--cookies", default=None, metavar="FILE",
+                        help="File cookie JSON cho backend http (tạo mới nếu chưa có)")
+    parser.add_argument("--max-retries", type=int, default=4, help="Số lần thử lại tối đa mỗi trang")
+    parser.add_argument("--retry-budget", type=int, default=50, help="Tổng số lần thử lại cho cả lượt crawl")
+    parser.add_argument("--delta", action="store_true",
+                        help="Ghi thêm file lazada_changes_* (sản phẩm mới / thay đổi; biến mất cần --detect-removed)")
+    parser.add_argument("--delta-only", action="store_true",
+                        help="Như --delta nhưng file sản phẩm chỉ chứa dòng mới / thay đổi")
+    parser.add_argument("--detect-removed", action="store_true",
+                        help="Với --delta: ghi cả sản phẩm biến mất (chỉ dùng khi crawl đủ toàn bộ trang)")
+    parser.add_argument("--fingerprints", default=DEFAULT_STORE_PATH, metavar="FILE",
+                        help="SQLite lưu fingerprint sản phẩm giữa các lần crawl")
+    parser.add_argument("--format", choices=["csv", "parquet", "both"], default="csv",
+                        help="parquet: ghi lazada_parquet/category_slug=*/crawl_date=* với cột có kiểu")
+    parser.add_argument("--metrics", default=None, metavar="FILE",
+                        help="Ghi tóm tắt metrics JSON khi kết thúc (vd crawl_metrics.json)")
+    parser.add_argument("--prometheus", default=None, metavar="FILE",
+                        help="File text Prometheus, cập nhật định kỳ trong lúc crawl")
+    parser.add_argument("--stream", action="store_true",
+                        help="Ghi CSV theo từng trang trong lúc crawl thay vì ghi một lần cuối")
+    args = parser.parse_args(argv)
+
+    _, default_start, default_end = _parse_job("default:" + args.pages, 1, 10)
+    jobs = [_parse_job(spec, default_start, default_end) for spec in args.jobs]
+
+    cache = None
+    if args.cache or args.replay:
+        cache = CatalogCache(args.cache or DEFAULT_CACHE_DIR, ttl=args.cache_ttl * 3600)
+
+    delta = FingerprintStore(args.fingerprints) if args.delta or args.delta_only else None
+
+    metrics = CrawlMetrics(prom_path=args.prometheus) if args.metrics or args.prometheus else None
+
+    journal = None if args.replay else CrawlJournal(args.journal, resume=args.resume)
+    saved = crawl_batch(jobs, concurrency=args.concurrency, rate=args.rate, headless=args.headless,
+                        journal=journal, cache=cache, replay=args.replay,
+                        backend=args.backend, cookies_file=args.cookies, stream=args.stream,
+                        retry=RetryPolicy(max_retries=args.max_retries, budget=args.retry_budget),
+                        delta=delta, snapshot=not args.delta_only, detect_removed=args.detect_removed,
+                        output_format=args.format,
+                        metrics=metrics)
+    for keyword, paths in saved.items():
+        for path in _flat_paths(paths):
+            print(f"📁 {keyword}: {path}")
+
+    if metrics:
+        summary = metrics.summary()
+        print(f"📊 {summary['requests']} requests, {summary['items']} items, "
+              f"{summary['items_per_second']} items/s, error rate {summary['error_rate']:.1%}")
+        if args.metrics:
+            print(f"📊 Metrics: {metrics.write_json(args.metrics)}")
+        if args.prometheus:
+            metrics.write_prometheus(args.prometheus)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        _batch_main(sys.argv[1:])
+    else:
+        _interactive_main()
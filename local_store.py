@@ -0,0 +1,146 @@
+"""Embedded SQLite analytical store on the import_to_lazada_etl schema, with a small query API.
+
+build_local_store() loads the category CSV folders (or a Parquet store) into a local
+SQLite file through the same loader as Postgres, so the file has the products table,
+its lazada_id / category indexes, price history and the incrementally maintained
+category_stats / category_histograms aggregates. LocalStore answers dashboard
+queries from those aggregates without scanning products.
+"""
+import os
+import sqlite3
+
+import pandas as pd
+
+import import_to_lazada_etl as etl
+
+DEFAULT_STORE_PATH = "lazada_local.sqlite"
+
+
+def local_db_url(path=DEFAULT_STORE_PATH):
+    return f"sqlite:///{os.path.abspath(path)}"
+
+
+def build_local_store(path=DEFAULT_STORE_PATH, parquet_root=None, force=False):
+    """Create or refresh the local store; only files not loaded yet are read."""
+    etl.load_csvs(parquet_root=parquet_root, force=force, db_url=local_db_url(path))
+    return LocalStore(path)
+
+
+class LocalStore:
+    """Read API over a local store file. Aggregate queries never touch products."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run build_local_store() first")
+        self.path = path
+        self.conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        self.conn.row_factory = sqlite3.Row
+
+    def _rows(self, sql, params=()):
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def total_products(self):
+        return self.conn.execute("SELECT COALESCE(SUM(product_count), 0) FROM category_stats").fetchone()[0]
+
+    def category_counts(self):
+        """Series category -> product count, largest first (what merge_csv's print_stats takes)."""
+        rows = self.conn.execute(
+            "SELECT category, product_count FROM category_stats ORDER BY product_count DESC, category"
+        ).fetchall()
+        return pd.Series(dict(rows), dtype="int64")
+
+    def top_categories(self, n=5):
+        return self._rows(
+            "SELECT category, product_count FROM category_stats "
+            "ORDER BY product_count DESC, category LIMIT ?",
+            (n,),
+        )
+
+    def category_summary(self, category=None):
+        """Count and average price / discount / rating per category (or for one category)."""
+        sql = """
+            SELECT category, product_count,
+                   price_sum / NULLIF(price_count, 0) AS avg_price,
+                   discount_sum / NULLIF(discount_count, 0) AS avg_discount,
+                   rating_sum / NULLIF(rating_count, 0) AS avg_rating
+            FROM category_stats
+        """
+        if category is None:
+            return self._rows(sql + " ORDER BY product_count DESC, category")
+        return self._rows(sql + " WHERE category = ?", (category,))
+
+    def distribution(self, metric, category=None):
+        """{bucket lower bound: count} of "rating" or "discount", for one category or all."""
+        if metric not in etl.HISTOGRAM_BUCKETS:
+            raise ValueError(f"metric must be one of {sorted(etl.HISTOGRAM_BUCKETS)}")
+        sql = "SELECT bucket, SUM(count) FROM category_histograms WHERE metric = ?"
+        params = [metric]
+        if category is not None:
+            sql += " AND category = ?"
+            params.append(category)
+        rows = self.conn.execute(sql + " GROUP BY bucket ORDER BY bucket", params).fetchall()
+        return {bucket: count for bucket, count in rows}
+
+    def price_history(self, lazada_id):
+        return self._rows(
+            "SELECT price, original_price, rating_score, valid_from, valid_to, is_current "
+            "FROM product_price_history WHERE lazada_id = ? ORDER BY valid_from",
+            (str(lazada_id),),
+        )
+
+    def products(self, category=None, min_rating=None, max_price=None, limit=100):
+        """Product rows filtered on the indexed category plus optional rating / price bounds."""
+        clauses, params = [], []
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        if min_rating is not None:
+            clauses.append("rating_score >= ?")
+            params.append(min_rating)
+        if max_price is not None:
+            clauses.append("price <= ?")
+            params.append(max_price)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._rows(
+            f"SELECT lazada_id, name, price, original_price, discount, rating_score, rating_count, category, url "
+            f"FROM products {where} ORDER BY rating_count DESC LIMIT ?",
+            (*params, limit),
+        )
+
+    def query(self, sql, params=()):
+        """Ad-hoc read-only SQL as a DataFrame."""
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def close(self):
+        self.conn.close()
+
+
+def print_summary(store, top=5):
+    print("\n[STATS] Thống kê kho local:")
+    print(f"  - Tổng sản phẩm: {store.total_products()}")
+    print(f"\n  Top {top} category:")
+    for row in store.top_categories(top):
+        print(f"    {row['category']}: {row['product_count']} sản phẩm")
+    print("\n  Phân bố rating:")
+    for bucket, count in store.distribution("rating").items():
+        print(f"    >= {bucket:g}: {count}")
+    print("\n  Phân bố giảm giá (%):")
+    for bucket, count in store.distribution("discount").items():
+        print(f"    >= {bucket:g}: {count}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build / refresh the local SQLite store and print its stats.")
+    parser.add_argument("parquet_root", nargs="?", help="Load a partitioned Parquet store instead of the CSV folders")
+    parser.add_argument("--path", default=DEFAULT_STORE_PATH, help="Store file")
+    parser.add_argument("--force", action="store_true", help="Reload files already in the store")
+    parser.add_argument("--stats-only", action="store_true", help="Only print stats, do not load")
+    args = parser.parse_args()
+
+    store = LocalStore(args.path) if args.stats_only else build_local_store(
+        args.path, parquet_root=args.parquet_root, force=args.force
+    )
+    print_summary(store)
+    store.close()
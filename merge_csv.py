@@ -2,26 +2,399 @@
 Script để merge các file CSV và loại bỏ sản phẩm trùng lặp dựa vào ID
 """
 import pandas as pd
+import numpy as np
 import os
 import glob
+import hashlib
+import sqlite3
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+from near_duplicates import mark_near_duplicates
+from product_store import (
+    PARQUET_ROOT,
+    canonical_product_ids,
+    crawl_timestamp,
+    is_parquet_path,
+    iter_product_chunks,
+    pin_product_schema,
+    product_columns,
+    read_products,
+)
 
-def merge_csv_files(pattern="**/*.csv", output_file=None, id_column="item_id"):
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # chỉ cần cho engine="arrow"
+    pa = pa_csv = None
+
+POSSIBLE_ID_COLUMNS = ['item_id', 'id', 'product_id', 'url_san_pham']
+
+# Cột ID chuẩn hóa tính từ url_san_pham khi merge (xem product_store.canonical_product_ids)
+CANONICAL_ID_COLUMN = 'product_id'
+
+
+def find_input_files(pattern):
+    """Tìm file input theo pattern, bỏ qua file merged cũ và file sự kiện delta"""
+    csv_files = glob.glob(pattern, recursive=True)
+    csv_files = [f for f in csv_files if not f.startswith("merged_")]  # Bỏ qua file merged cũ
+    csv_files = [f for f in csv_files if not os.path.basename(f).startswith("lazada_changes_")]  # File sự kiện delta, không phải snapshot
+    return csv_files
+
+
+def order_files(files, keep="first"):
+    """
+    Sắp thứ tự file theo chính sách loại trùng.
+    
+    keep="first" (mặc định): giữ nguyên thứ tự tìm thấy, như merge_incremental.
+    keep="latest": file crawl mới nhất trước, nên giữ dòng đầu tiên = giữ snapshot mới nhất.
+    """
+    if keep == "latest":
+        return sorted(files, key=crawl_timestamp, reverse=True)
+    if keep == "first":
+        return list(files)
+    raise ValueError(f"keep không hợp lệ: {keep!r} (chỉ 'latest' hoặc 'first')")
+
+
+def add_canonical_id(df):
+    """Thêm cột product_id (ID sản phẩm chuẩn hóa từ url_san_pham) nếu chưa có"""
+    if 'url_san_pham' not in df.columns or CANONICAL_ID_COLUMN in df.columns:
+        return df
+    return df.assign(**{CANONICAL_ID_COLUMN: canonical_product_ids(df['url_san_pham'])})
+
+
+def resolve_id_column(columns, id_column):
+    """Trả về cột ID dùng để loại trùng, hoặc None nếu phải so sánh toàn bộ cột"""
+    if id_column in columns:
+        print(f"[INFO] Loại bỏ trùng lặp dựa vào cột '{id_column}'")
+        return id_column
+
+    # Thử tìm cột ID khác
+    for col in POSSIBLE_ID_COLUMNS:
+        if col in columns:
+            print(f"[INFO] Sử dụng cột '{col}' để loại trùng")
+            return col
+
+    print(f"[WARN] Không tìm thấy cột ID. Các cột có sẵn: {list(columns)}")
+    print("[INFO] Sẽ loại trùng dựa vào tất cả cột")
+    return None
+
+
+def print_stats(unique_rows, category_counts=None):
+    """In thống kê sau khi merge; category_counts là Series value_counts của cột category"""
+    print("\n[STATS] Thống kê dữ liệu:")
+    print(f"  - Tổng sản phẩm unique: {unique_rows}")
+    if category_counts is not None:
+        print(f"  - Số category: {len(category_counts)}")
+        print("\n  Top 5 category:")
+        for cat, count in category_counts.head().items():
+            print(f"    {cat}: {count} sản phẩm")
+
+
+def _read_pinned(path, columns=None):
+    """Worker: đọc một file với mọi cột là chuỗi rồi ép về schema cố định"""
+    try:
+        if is_parquet_path(path):
+            df = read_products(path, columns=columns)
+        else:
+            usecols = None if columns is None else (lambda c: c in columns)
+            df = pd.read_csv(path, encoding="utf-8-sig", dtype=str, usecols=usecols)
+        return pin_product_schema(df), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _read_pinned_arrow(path, columns=None):
+    """Worker cho engine="arrow": pyarrow.csv đọc đa luồng, không giữ GIL"""
+    try:
+        if is_parquet_path(path):
+            return _read_pinned(path, columns)
+        header = product_columns(path)
+        include = [c for c in header if columns is None or c in columns]
+        table = pa_csv.read_csv(
+            path,
+            convert_options=pa_csv.ConvertOptions(
+                column_types={c: pa.string() for c in header},
+                include_columns=include,
+            ),
+        )
+        return pin_product_schema(table.to_pandas()), None
+    except Exception as e:
+        return None, str(e)
+
+
+def whole_numbers_as_int(df):
+    """Cột số thực chỉ chứa số nguyên (giá 100.0) ghi lại thành Int64 (100), như trong file gốc"""
+    converted = {}
+    for col in df.select_dtypes("float").columns:
+        values = df[col].dropna()
+        if np.isfinite(values).all() and values.eq(values.round()).all():
+            converted[col] = df[col].astype("Int64")
+    return df.assign(**converted) if converted else df
+
+
+def read_files_parallel(csv_files, workers=None, columns=None, engine="process"):
+    """
+    Đọc nhiều file song song theo schema cố định (PRODUCT_FIELDS có kiểu, cột khác là chuỗi).
+    
+    Args:
+        csv_files: Danh sách file CSV / Parquet
+        workers: Số process / thread (mặc định: số core)
+        columns: Chỉ đọc các cột này
+        engine: "process" (ProcessPoolExecutor + pandas) hoặc "arrow" (thread + pyarrow.csv)
+    
+    Returns:
+        List (file, DataFrame hoặc None, lỗi hoặc None) theo đúng thứ tự csv_files
+    """
+    workers = workers or os.cpu_count() or 1
+    if engine == "arrow":
+        if pa_csv is None:
+            raise RuntimeError('engine="arrow" cần pyarrow: pip install pyarrow')
+        executor, reader = ThreadPoolExecutor(max_workers=workers), _read_pinned_arrow
+    elif engine == "process":
+        executor, reader = ProcessPoolExecutor(max_workers=workers), _read_pinned
+    else:
+        raise ValueError(f"engine không hợp lệ: {engine!r}")
+    
+    with executor:
+        results = executor.map(reader, csv_files, [columns] * len(csv_files))
+        return [(f, df, err) for f, (df, err) in zip(csv_files, results)]
+
+
+def _sorted_contains(sorted_keys, values):
+    """Mask: values nằm trong mảng sorted_keys đã sort (searchsorted, không sort lại)"""
+    if not len(sorted_keys):
+        return np.zeros(len(values), dtype=bool)
+    idx = np.searchsorted(sorted_keys, values)
+    return sorted_keys[np.minimum(idx, len(sorted_keys) - 1)] == values
+
+
+class HashKeySet:
+    """
+    Tập key đã gặp, lưu dưới dạng hash 64-bit (8 byte/key) thay vì giá trị gốc.
+    
+    Trong RAM là vài mảng uint64 đã sort (runs) với kích thước tăng dần theo cấp số
+    nhân: key mới thành một run nhỏ, hai run cuối được gộp khi run trước không lớn
+    hơn gấp đôi run sau, tra cứu bằng searchsorted trên từng run. Mỗi key chỉ bị sort
+    lại O(log N) lần thay vì sort lại toàn bộ tập key ở mỗi chunk. Khi vượt quá
+    max_keys sẽ chuyển sang bảng SQLite trên đĩa nên bộ nhớ bị chặn trên. Xác suất
+    đụng hash 64-bit không đáng kể ở quy mô catalog (~1e-7 với 1 tỷ key).
+    """
+    
+    def __init__(self, max_keys=20_000_000, spill_path=None):
+        self.max_keys = max_keys
+        self.spill_path = spill_path
+        self.runs = []
+        self.conn = None
+        self.size = 0
+        self._temp_spill = False
+    
+    def add_new(self, hashes):
+        """Thêm hashes (theo thứ tự), trả về mask True cho lần xuất hiện đầu tiên của mỗi key"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        first = ~pd.Series(hashes).duplicated(keep='first').to_numpy()
+        
+        if self.conn is None:
+            seen = np.zeros(len(hashes), dtype=bool)
+            for run in self.runs:
+                seen |= _sorted_contains(run, hashes)
+        else:
+            seen = self._seen_on_disk(hashes)
+        new = first & ~seen
+        
+        self._store(hashes[new])
+        return new
+    
+    def _store(self, new_hashes):
+        self.size += len(new_hashes)
+        if self.conn is None and self.size > self.max_keys:
+            self._spill()
+        if self.conn is None:
+            # new_hashes không trùng nhau và chưa có trong runs nên chỉ cần sort khi gộp
+            if len(new_hashes):
+                self.runs.append(np.sort(new_hashes))
+            while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+                last = self.runs.pop()
+                self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]))
+        else:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO seen_keys VALUES (?)",
+                    ((int(h),) for h in new_hashes.view(np.int64)),
+                )
+    
+    def _spill(self):
+        if self.spill_path is None:
+            fd, self.spill_path = tempfile.mkstemp(prefix="merge_keys_", suffix=".sqlite")
+            os.close(fd)
+            self._temp_spill = True
+        print(f"[INFO] Tập key vượt {self.max_keys}, chuyển sang đĩa: {self.spill_path}")
+        self.conn = sqlite3.connect(self.spill_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen_keys (h INTEGER PRIMARY KEY)")
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen_keys VALUES (?)",
+                ((int(h),) for run in self.runs for h in run.view(np.int64)),
+            )
+        self.runs = []
+    
+    def _seen_on_disk(self, hashes):
+        signed = hashes.view(np.int64)
+        found = set()
+        for start in range(0, len(signed), 900):  # giới hạn số tham số của SQLite
+            batch = [int(h) for h in signed[start:start + 900]]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                row[0] for row in self.conn.execute(
+                    f"SELECT h FROM seen_keys WHERE h IN ({placeholders})", batch
+                )
+            )
+        return np.fromiter((int(h) in found for h in signed), dtype=bool, count=len(signed))
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self._temp_spill:
+            os.remove(self.spill_path)
+            self._temp_spill = False
+
+
+def merge_csv_files_streaming(pattern="**/*.csv", output_file=None, id_column="item_id", columns=None,
+                              chunksize=100_000, max_keys_in_memory=20_000_000, keep="first"):
+    """
+    Merge kiểu streaming: đọc từng chunk, loại trùng bằng HashKeySet và ghi ngay ra file.
+    
+    Bộ nhớ tỉ lệ với số sản phẩm unique (8 byte/key, có thể tràn ra đĩa) thay vì
+    tổng dung lượng dữ liệu. Giữ nguyên chính sách keep và thống kê của
+    merge_csv_files. Tham số giống merge_csv_files, thêm:
+    
+    Args:
+        chunksize: Số dòng mỗi chunk
+        max_keys_in_memory: Số key tối đa giữ trong RAM trước khi chuyển sang SQLite
+    """
+    
+    print(f"[INFO] Đang tìm file CSV với pattern: {pattern}")
+    
+    csv_files = order_files(find_input_files(pattern), keep)
+    if not csv_files:
+        print("[WARN] Không tìm thấy file CSV nào!")
+        return None
+    
+    print(f"[INFO] Tìm thấy {len(csv_files)} file CSV")
+    
+    # Header chung = hợp các cột theo thứ tự xuất hiện (giống pd.concat)
+    all_columns = []
+    readable_files = []
+    for csv_file in csv_files:
+        try:
+            file_columns = product_columns(csv_file)
+        except Exception as e:
+            print(f"[WARN] Lỗi khi đọc {csv_file}: {e}")
+            continue
+        readable_files.append(csv_file)
+        for col in file_columns:
+            if col not in all_columns and (columns is None or col in columns):
+                all_columns.append(col)
+    
+    if not readable_files:
+        print("[WARN] Không có dữ liệu để merge!")
+        return None
+    
+    if 'url_san_pham' in all_columns and CANONICAL_ID_COLUMN not in all_columns:
+        all_columns.append(CANONICAL_ID_COLUMN)
+    id_column = resolve_id_column(all_columns, id_column)
+    key_columns = [id_column] if id_column else all_columns
+    
+    if not output_file:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = f"merged_products_{timestamp}.csv"
+    
+    keys = HashKeySet(max_keys=max_keys_in_memory)
+    total_rows = 0
+    unique_rows = 0
+    category_counts = Counter()
+    
+    try:
+        with open(output_file, "w", newline="", encoding="utf-8-sig") as out:
+            pd.DataFrame(columns=all_columns).to_csv(out, index=False)
+            
+            for csv_file in readable_files:
+                file_rows = 0
+                try:
+                    # Đọc CSV dạng chuỗi (như merge_incremental) để cùng một id luôn ra
+                    # cùng một hash dù pandas đoán kiểu cột khác nhau giữa các file / chunk
+                    for chunk in iter_product_chunks(csv_file, chunksize=chunksize, columns=columns,
+                                                     csv_dtype=str):
+                        chunk = add_canonical_id(chunk).reindex(columns=all_columns)
+                        key_frame = chunk[key_columns].astype("string")
+                        hashes = pd.util.hash_pandas_object(key_frame, index=False).to_numpy()
+                        kept = chunk[keys.add_new(hashes)]
+                        
+                        kept.to_csv(out, header=False, index=False)
+                        out.flush()
+                        
+                        file_rows += len(chunk)
+                        unique_rows += len(kept)
+                        if 'category' in kept.columns:
+                            category_counts.update(kept['category'].dropna())
+                except Exception as e:
+                    print(f"[WARN] Lỗi khi đọc {csv_file}: {e}")
+                total_rows += file_rows
+                print(f"[INFO] Đọc {file_rows} dòng từ: {os.path.basename(csv_file)}")
+    finally:
+        keys.close()
+    
+    duplicates = total_rows - unique_rows
+    print(f"\n[INFO] Tổng số dòng trước khi loại trùng: {total_rows}")
+    print(f"[INFO] Số dòng sau khi loại trùng: {unique_rows}")
+    if total_rows:
+        print(f"[INFO] Đã loại bỏ {duplicates} dòng trùng lặp ({duplicates/total_rows*100:.1f}%)")
+    print(f"\n[SUCCESS] Đã lưu file merge vào: {output_file}")
+    
+    counts = None
+    if 'category' in all_columns:
+        counts = pd.Series(dict(category_counts.most_common()), dtype="int64")
+    print_stats(unique_rows, counts)
+    
+    return output_file
+
+
+def merge_csv_files(pattern="**/*.csv", output_file=None, id_column="item_id", columns=None,
+                    streaming=False, chunksize=100_000, workers=1, engine="process", keep="first",
+                    near_dedup=False):
     """
     Merge tất cả file CSV và loại bỏ trùng lặp dựa vào ID sản phẩm
     
     Args:
-        pattern: Pattern để tìm file CSV (mặc định: **/*.csv tìm tất cả file trong subfolders)
+        pattern: Pattern để tìm file CSV (mặc định: **/*.csv tìm tất cả file trong subfolders).
+                 Pattern *.parquet cũng được hỗ trợ (vd: lazada_parquet/**/*.parquet)
         output_file: Tên file output (mặc định: merged_products_TIMESTAMP.csv)
         id_column: Tên cột ID để check trùng lặp (mặc định: item_id)
+        columns: Chỉ đọc các cột này (mặc định: tất cả cột)
+        streaming: True để merge theo chunk với bộ nhớ giới hạn (xem merge_csv_files_streaming)
+        chunksize: Số dòng mỗi chunk khi streaming
+        workers: > 1 (hoặc None = số core) để đọc file song song theo schema cố định
+        engine: "process" hoặc "arrow" khi đọc song song (xem read_files_parallel)
+        keep: "first" (mặc định) giữ dòng gặp đầu tiên theo thứ tự file tìm thấy,
+              "latest" giữ snapshot mới nhất theo thời điểm crawl trong tên file
+        near_dedup: True để đánh dấu sản phẩm gần trùng (đăng lại với tên hơi khác) vào
+                    cột is_duplicate bằng MinHash LSH (xem near_duplicates.py); dòng
+                    không bị xóa, dòng đầu của mỗi cụm giữ is_duplicate=False
+    
+    Khi có cột url_san_pham, cột product_id (ID chuẩn hóa, xem add_canonical_id) được
+    thêm vào và dùng để loại trùng nếu không có item_id / id.
     """
+    if streaming:
+        return merge_csv_files_streaming(pattern=pattern, output_file=output_file, id_column=id_column,
+                                         columns=columns, chunksize=chunksize, keep=keep)
     
     print(f"[INFO] Đang tìm file CSV với pattern: {pattern}")
     
-    # Tìm tất cả file CSV
-    csv_files = glob.glob(pattern, recursive=True)
-    csv_files = [f for f in csv_files if not f.startswith("merged_")]  # Bỏ qua file merged cũ
+    # Tìm tất cả file CSV, file mới nhất trước nếu keep="latest"
+    csv_files = order_files(find_input_files(pattern), keep)
     
     if not csv_files:
         print("[WARN] Không tìm thấy file CSV nào!")
@@ -33,44 +406,39 @@ def merge_csv_files(pattern="**/*.csv", output_file=None, id_column="item_id"):
     all_data = []
     total_rows = 0
     
-    for csv_file in csv_files:
-        try:
-            df = pd.read_csv(csv_file, encoding='utf-8-sig')
+    if workers != 1:
+        for csv_file, df, error in read_files_parallel(csv_files, workers=workers, columns=columns, engine=engine):
+            if error is not None:
+                print(f"[WARN] Lỗi khi đọc {csv_file}: {error}")
+                continue
+            total_rows += len(df)
+            all_data.append(df)
+            print(f"[INFO] Đọc {len(df)} dòng từ: {os.path.basename(csv_file)}")
+    else:
+        # Cùng schema cố định với đường song song, để hai cách đọc ghi ra cùng một file
+        for csv_file in csv_files:
+            df, error = _read_pinned(csv_file, columns)
+            if error is not None:
+                print(f"[WARN] Lỗi khi đọc {csv_file}: {error}")
+                continue
             rows = len(df)
             total_rows += rows
             all_data.append(df)
             print(f"[INFO] Đọc {rows} dòng từ: {os.path.basename(csv_file)}")
-        except Exception as e:
-            print(f"[WARN] Lỗi khi đọc {csv_file}: {e}")
     
     if not all_data:
         print("[WARN] Không có dữ liệu để merge!")
         return None
     
     # Merge tất cả DataFrame
-    merged_df = pd.concat(all_data, ignore_index=True)
+    merged_df = add_canonical_id(pd.concat(all_data, ignore_index=True))
     print(f"\n[INFO] Tổng số dòng trước khi loại trùng: {total_rows}")
     
     # Loại bỏ trùng lặp dựa vào ID
-    # Kiểm tra cột ID có tồn tại không
-    if id_column not in merged_df.columns:
-        # Thử tìm cột ID khác
-        possible_id_columns = ['item_id', 'id', 'product_id', 'url_san_pham']
-        id_column = None
-        for col in possible_id_columns:
-            if col in merged_df.columns:
-                id_column = col
-                break
-        
-        if not id_column:
-            print(f"[WARN] Không tìm thấy cột ID. Các cột có sẵn: {list(merged_df.columns)}")
-            print("[INFO] Sẽ loại trùng dựa vào tất cả cột")
-            merged_df = merged_df.drop_duplicates()
-        else:
-            print(f"[INFO] Sử dụng cột '{id_column}' để loại trùng")
-            merged_df = merged_df.drop_duplicates(subset=[id_column], keep='first')
+    id_column = resolve_id_column(merged_df.columns, id_column)
+    if not id_column:
+        merged_df = merged_df.drop_duplicates()
     else:
-        print(f"[INFO] Loại bỏ trùng lặp dựa vào cột '{id_column}'")
         merged_df = merged_df.drop_duplicates(subset=[id_column], keep='first')
     
     unique_rows = len(merged_df)
@@ -79,41 +447,245 @@ def merge_csv_files(pattern="**/*.csv", output_file=None, id_column="item_id"):
     print(f"[INFO] Số dòng sau khi loại trùng: {unique_rows}")
     print(f"[INFO] Đã loại bỏ {duplicates} dòng trùng lặp ({duplicates/total_rows*100:.1f}%)")
     
+    if near_dedup and 'ten_san_pham' in merged_df.columns:
+        merged_df = mark_near_duplicates(merged_df)
+        near = int(merged_df['is_duplicate'].sum())
+        print(f"[INFO] Đánh dấu {near} sản phẩm gần trùng (is_duplicate=True)")
+    
     # Tạo tên file output
     if not output_file:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = f"merged_products_{timestamp}.csv"
     
     # Lưu file
-    merged_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    whole_numbers_as_int(merged_df).to_csv(output_file, index=False, encoding='utf-8-sig')
     print(f"\n[SUCCESS] Đã lưu file merge vào: {output_file}")
     
     # Hiển thị thống kê
-    print("\n[STATS] Thống kê dữ liệu:")
-    print(f"  - Tổng sản phẩm unique: {unique_rows}")
-    if 'category' in merged_df.columns:
-        print(f"  - Số category: {merged_df['category'].nunique()}")
-        print("\n  Top 5 category:")
-        for cat, count in merged_df['category'].value_counts().head().items():
-            print(f"    {cat}: {count} sản phẩm")
+    counts = merged_df['category'].value_counts() if 'category' in merged_df.columns else None
+    print_stats(unique_rows, counts)
     
     return output_file
 
 
-def merge_by_keyword(keyword, output_file=None):
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _open_merge_state(state_db):
+    conn = sqlite3.connect(state_db)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS manifest (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            sha256 TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            appended INTEGER NOT NULL,
+            merged_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS product_ids (id TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS category_counts (category TEXT PRIMARY KEY, count INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """)
+    return conn
+
+
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+
+def merge_incremental(pattern="**/*.csv", output_file="merged_products.csv", state_db="merge_state.sqlite",
+                      id_column="item_id", chunksize=100_000):
+    """
+    Merge tăng dần: chỉ đọc file mới và chỉ append sản phẩm chưa có vào một file output cố định.
+    
+    State nằm trong SQLite (state_db):
+      - manifest: path, size, mtime, sha256 của từng file đã merge. File giữ nguyên
+        size/mtime được bỏ qua ngay; file có hash đã gặp cũng bỏ qua.
+      - product_ids: ID sản phẩm đã có trong output (keep='first' theo thứ tự file tìm
+        thấy, cả trong lần chạy đầu và giữa các lần chạy; không hỗ trợ keep='latest').
+      - category_counts: thống kê category cập nhật dần, không cần đọc lại output.
+    Mỗi file được commit cùng kích thước output sau khi append; nếu lần chạy trước
+    dừng giữa chừng, phần append dở sẽ bị cắt bỏ trước khi chạy tiếp.
+    
+    Args:
+        pattern: Pattern để tìm file CSV / Parquet
+        output_file: File merged cố định, được append qua các lần chạy
+        state_db: File SQLite chứa manifest và index ID
+        id_column: Tên cột ID để check trùng lặp (mặc định: item_id)
+        chunksize: Số dòng mỗi chunk khi đọc file mới
+    """
+    
+    print(f"[INFO] Đang tìm file CSV với pattern: {pattern}")
+    csv_files = [f for f in find_input_files(pattern) if os.path.abspath(f) != os.path.abspath(output_file)]
+    
+    conn = _open_merge_state(state_db)
+    try:
+        manifest = {
+            path: (size, mtime, sha256)
+            for path, size, mtime, sha256 in conn.execute("SELECT path, size, mtime, sha256 FROM manifest")
+        }
+        
+        known_hashes = {sha256 for _, _, sha256 in manifest.values()}
+        new_files = []
+        for csv_file in csv_files:
+            stat = os.stat(csv_file)
+            known = manifest.get(csv_file)
+            if known and known[0] == stat.st_size and known[1] == stat.st_mtime:
+                continue
+            sha256 = _file_sha256(csv_file)
+            if known and known[2] == sha256:
+                with conn:
+                    conn.execute("UPDATE manifest SET mtime = ? WHERE path = ?", (stat.st_mtime, csv_file))
+                continue
+            if sha256 in known_hashes:
+                # Cùng nội dung với một file đã merge (bị copy / đổi chỗ), không cần đọc lại
+                continue
+            new_files.append((csv_file, stat, sha256))
+        
+        print(f"[INFO] Tìm thấy {len(csv_files)} file, {len(new_files)} file mới cần merge")
+        
+        # Cắt phần append dở dang của lần chạy bị gián đoạn trước đó
+        committed_size = _get_meta(conn, "output_size")
+        if committed_size is not None and os.path.exists(output_file):
+            if os.path.getsize(output_file) > int(committed_size):
+                print("[WARN] Output có phần ghi dở từ lần chạy trước, đang cắt bỏ")
+                with open(output_file, "r+b") as f:
+                    f.truncate(int(committed_size))
+        
+        header = None
+        if committed_size is not None and os.path.exists(output_file):
+            header = list(pd.read_csv(output_file, encoding="utf-8-sig", nrows=0).columns)
+        
+        if new_files and header is None:
+            # Lần chạy đầu: header = hợp các cột của các file mới, giống pd.concat
+            header = []
+            for csv_file, _, _ in new_files:
+                for col in product_columns(csv_file):
+                    if col not in header:
+                        header.append(col)
+            if 'url_san_pham' in header and CANONICAL_ID_COLUMN not in header:
+                header.append(CANONICAL_ID_COLUMN)
+            with open(output_file, "w", newline="", encoding="utf-8-sig") as out:
+                pd.DataFrame(columns=header).to_csv(out, index=False)
+            with conn:
+                conn.execute("DELETE FROM product_ids")
+                conn.execute("DELETE FROM category_counts")
+                _set_meta(conn, "id_column", resolve_id_column(header, id_column) or "")
+                _set_meta(conn, "output_size", os.path.getsize(output_file))
+        
+        key_column = _get_meta(conn, "id_column") or None
+        total_rows = 0
+        appended_rows = 0
+        
+        for csv_file, stat, sha256 in new_files:
+            file_rows = 0
+            file_appended = 0
+            categories = Counter()
+            try:
+                with conn, open(output_file, "a", newline="", encoding="utf-8") as out:
+                    # dtype=str: giữ nguyên giá trị CSV, ID không bị đổi kiểu giữa các file / lần chạy
+                    for chunk in iter_product_chunks(csv_file, chunksize=chunksize, csv_dtype=str):
+                        chunk = add_canonical_id(chunk).reindex(columns=header)
+                        if key_column:
+                            keys = chunk[key_column].astype("string").fillna("<NA>")
+                        else:
+                            keys = pd.util.hash_pandas_object(chunk, index=False).astype(str)
+                        
+                        is_new = []
+                        for key in keys:
+                            cursor = conn.execute("INSERT OR IGNORE INTO product_ids VALUES (?)", (key,))
+                            is_new.append(cursor.rowcount == 1)
+                        kept = chunk[is_new]
+                        
+                        kept.to_csv(out, header=False, index=False)
+                        file_rows += len(chunk)
+                        file_appended += len(kept)
+                        if 'category' in kept.columns:
+                            categories.update(kept['category'].dropna())
+                    
+                    out.flush()
+                    os.fsync(out.fileno())
+                    output_size = os.path.getsize(output_file)
+                    
+                    conn.executemany(
+                        "INSERT INTO category_counts VALUES (?, ?) "
+                        "ON CONFLICT(category) DO UPDATE SET count = count + excluded.count",
+                        categories.items(),
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (csv_file, stat.st_size, stat.st_mtime, sha256, file_rows, file_appended,
+                         datetime.now().isoformat(timespec="seconds")),
+                    )
+                    _set_meta(conn, "output_size", output_size)
+            except Exception as e:
+                print(f"[WARN] Lỗi khi đọc {csv_file}: {e}")
+                # Bỏ phần đã append của file lỗi, state đã được rollback
+                with open(output_file, "r+b") as f:
+                    f.truncate(int(_get_meta(conn, "output_size")))
+                continue
+            
+            total_rows += file_rows
+            appended_rows += file_appended
+            print(f"[INFO] Đọc {file_rows} dòng từ: {os.path.basename(csv_file)}, thêm {file_appended} sản phẩm mới")
+        
+        unique_rows = conn.execute("SELECT COUNT(*) FROM product_ids").fetchone()[0]
+        category_counts = pd.Series(
+            dict(conn.execute("SELECT category, count FROM category_counts ORDER BY count DESC")),
+            dtype="int64",
+        )
+    finally:
+        conn.close()
+    
+    print(f"\n[INFO] Dòng mới đọc: {total_rows}, sản phẩm mới thêm: {appended_rows}")
+    if header is None:
+        print("[WARN] Chưa có dữ liệu để merge!")
+        return None
+    print(f"[SUCCESS] File merge: {output_file}")
+    print_stats(unique_rows, category_counts if "category" in header else None)
+    
+    return output_file
+
+
+def merge_by_keyword(keyword, output_file=None, keep="first"):
     """
     Merge các file CSV của một keyword cụ thể
     
     Args:
         keyword: Từ khóa (tên folder)
         output_file: Tên file output
+        keep: Chính sách loại trùng, "first" hoặc "latest" (xem merge_csv_files)
     """
     pattern = f"{keyword}/*.csv"
     if not output_file:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = f"merged_{keyword}_{timestamp}.csv"
     
-    return merge_csv_files(pattern=pattern, output_file=output_file)
+    return merge_csv_files(pattern=pattern, output_file=output_file, keep=keep)
+
+
+def merge_parquet(root=PARQUET_ROOT, output_file=None, columns=None, keep="first"):
+    """
+    Merge toàn bộ kho Parquet (lazada_parquet/category_slug=*/crawl_date=*)
+    
+    Args:
+        root: Thư mục gốc của kho Parquet
+        output_file: Tên file output
+        columns: Chỉ đọc các cột này (mặc định: tất cả cột)
+        keep: Chính sách loại trùng, "first" hoặc "latest" (xem merge_csv_files)
+    """
+    return merge_csv_files(pattern=f"{root}/**/*.parquet", output_file=output_file, columns=columns, keep=keep)
 
 
 if __name__ == "__main__":
@@ -123,27 +695,47 @@ if __name__ == "__main__":
     print("MERGE CSV FILES - Loại bỏ trùng lặp")
     print("=" * 60)
     
+    # --latest: giữ snapshot mới nhất khi trùng ID (mặc định giữ dòng gặp đầu tiên)
+    args = [arg for arg in sys.argv[1:] if arg != "--latest"]
+    keep = "latest" if "--latest" in sys.argv[1:] else "first"
+    
     # Nếu có argument từ command line
-    if len(sys.argv) > 1:
-        keyword = sys.argv[1]
+    if args:
+        keyword = args[0]
         print(f"\n[INFO] Merge file cho keyword: {keyword}")
-        result = merge_by_keyword(keyword)
+        result = merge_by_keyword(keyword, keep=keep)
     else:
         # Interactive mode
         print("\nChọn chế độ:")
         print("1. Merge tất cả file CSV trong thư mục hiện tại")
         print("2. Merge file của một keyword cụ thể")
+        print(f"3. Merge kho Parquet ({PARQUET_ROOT}/)")
+        print("4. Merge tất cả file CSV kiểu streaming (bộ nhớ giới hạn)")
+        print("5. Merge tăng dần vào merged_products.csv (chỉ đọc file mới)")
+        print("6. Merge tất cả file CSV + đánh dấu sản phẩm gần trùng (is_duplicate)")
+        
+        choice = input("\nNhập lựa chọn (1-6): ").strip()
         
-        choice = input("\nNhập lựa chọn (1 hoặc 2): ").strip()
+        if choice in ("1", "2", "3", "4", "6") and keep == "first":
+            answer = input("Khi trùng ID, giữ snapshot mới nhất thay vì dòng gặp đầu tiên? (y/N): ")
+            keep = "latest" if answer.strip().lower() == "y" else "first"
         
         if choice == "1":
             # Merge tất cả
-            result = merge_csv_files()
+            result = merge_csv_files(keep=keep)
+        elif choice == "3":
+            result = merge_parquet(keep=keep)
+        elif choice == "4":
+            result = merge_csv_files(streaming=True, keep=keep)
+        elif choice == "5":
+            result = merge_incremental()
+        elif choice == "6":
+            result = merge_csv_files(near_dedup=True, keep=keep)
         elif choice == "2":
             # Merge theo keyword
             keyword = input("Nhập keyword (tên folder): ").strip()
             if keyword:
-                result = merge_by_keyword(keyword)
+                result = merge_by_keyword(keyword, keep=keep)
             else:
                 print("[ERROR] Keyword không được để trống!")
         else:
@@ -0,0 +1,156 @@
+"""Near-duplicate product detection: MinHash signatures over title shingles + LSH banding.
+
+Sellers relist the same item under a new id with a slightly edited title, which exact
+dedup on product_id cannot see. Every title is reduced to a fixed-size MinHash
+signature; rows of the same shop whose signatures agree on a whole LSH band become
+candidates, candidates are verified on price and on the estimated Jaccard similarity
+and connected into clusters. All steps are NumPy passes over the
+whole frame, so the cost grows roughly linearly with the number of rows.
+"""
+import numpy as np
+import pandas as pd
+
+# Prime just above 2**32: (a * x + b) % p with a, b, x < 2**32 never overflows uint64.
+_PRIME = np.uint64(4294967311)
+_MASK32 = np.uint64(0xFFFFFFFF)
+_GRAM_BASE = np.uint64(1000003)
+
+
+def normalize_titles(titles):
+    """Lowercase, drop punctuation and collapse whitespace; missing titles become ""."""
+    return (
+        titles.astype("string")
+        .fillna("")
+        .str.lower()
+        .str.replace(r"[^\w]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def _shingle_hashes(titles, k):
+    """(row, hash) of every character k-gram of every title, as two aligned arrays.
+
+    The titles are concatenated into one code-point array and a rolling polynomial hash
+    is taken over it; k-grams that straddle two titles are dropped. Titles shorter than
+    k are padded so they still produce one shingle.
+    """
+    titles = [t.ljust(k) for t in titles]
+    lengths = np.fromiter(map(len, titles), dtype=np.int64, count=len(titles))
+    codes = np.frombuffer("".join(titles).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    n_grams = len(codes) - k + 1
+    grams = np.zeros(n_grams, dtype=np.uint64)
+    for offset in range(k):
+        grams = grams * _GRAM_BASE + codes[offset:offset + n_grams]
+
+    char_rows = np.repeat(np.arange(len(titles)), lengths)
+    valid = char_rows[:n_grams] == char_rows[k - 1:]
+    grams = grams[valid]
+    return char_rows[:n_grams][valid], (grams ^ (grams >> np.uint64(32))) & _MASK32
+
+
+def minhash_signatures(titles, num_perm=64, k=4, seed=1, chunk_rows=200_000):
+    """uint32 MinHash signature matrix (len(titles) x num_perm) of normalized titles."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+
+    titles = list(titles)
+    signatures = np.empty((len(titles), num_perm), dtype=np.uint32)
+    for start in range(0, len(titles), chunk_rows):
+        chunk = titles[start:start + chunk_rows]
+        rows, grams = _shingle_hashes(chunk, k)
+        # rows is sorted, so each title's shingles form one contiguous run
+        run_starts = np.searchsorted(rows, np.arange(len(chunk)))
+        for perm in range(num_perm):
+            permuted = (a[perm] * grams + b[perm]) % _PRIME
+            signatures[start:start + len(chunk), perm] = np.minimum.reduceat(permuted, run_starts) & _MASK32
+    return signatures
+
+
+def _shop_codes(df):
+    shop = df["shop"] if "shop" in df.columns else pd.Series("", index=df.index)
+    return pd.factorize(shop.astype("string").fillna(""))[0].astype(np.uint64)
+
+
+def _prices(df):
+    if "gia_sale" not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df["gia_sale"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _connected_components(n, left, right):
+    """Smallest row position of every row's component, from an edge list (pointer jumping)."""
+    labels = np.arange(n)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, left, labels[right])
+        np.minimum.at(labels, right, labels[left])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def near_duplicate_clusters(df, title_column="ten_san_pham", num_perm=64, bands=16, k=4,
+                            threshold=0.8, price_tolerance=0.1, seed=1):
+    """Cluster representative (row position) of every row of df.
+
+    A row that is not a near duplicate of anything is its own representative; inside a
+    cluster the representative is the row that comes first in df. Candidate pairs must
+    share the shop and one full LSH band, and are kept only if their estimated title
+    Jaccard similarity is at least `threshold` and their gia_sale differs by at most
+    `price_tolerance` (relative; two missing prices also match). Empty titles are
+    never clustered.
+
+    Price is checked on the pair instead of being part of the bucket key, so two
+    prices just either side of a bucket boundary still match.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    rows_per_band = num_perm // bands
+
+    labels = np.arange(len(df))
+    titles = normalize_titles(df[title_column])
+    candidates = np.flatnonzero(titles.str.len().to_numpy() > 0)
+    if not len(candidates):
+        return labels
+    signatures = minhash_signatures(titles.iloc[candidates], num_perm=num_perm, k=k, seed=seed)
+    blocks = _shop_codes(df.iloc[candidates])
+    prices = _prices(df.iloc[candidates])
+
+    left, right = [], []
+    for band in range(bands):
+        band_sig = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        key = blocks * _GRAM_BASE
+        for col in range(rows_per_band):
+            key = key * _GRAM_BASE + band_sig[:, col]
+
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        group_start = np.r_[True, sorted_key[1:] != sorted_key[:-1]]
+        first = order[np.flatnonzero(group_start)[np.cumsum(group_start) - 1]]
+        members = ~group_start
+        left.append(first[members])
+        right.append(order[members])
+
+    left = np.concatenate(left)
+    right = np.concatenate(right)
+
+    similarity = (signatures[left] == signatures[right]).mean(axis=1)
+    price_left, price_right = prices[left], prices[right]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        price_gap = np.abs(price_left - price_right) / np.maximum(price_left, price_right)
+    same_price = (price_gap <= price_tolerance) | (np.isnan(price_left) & np.isnan(price_right))
+    verified = (similarity >= threshold) & same_price
+    components = _connected_components(len(candidates), left[verified], right[verified])
+    labels[candidates] = candidates[components]
+    return labels
+
+
+def mark_near_duplicates(df, **kwargs):
+    """Copy of df with is_duplicate = True on every row except the first of its cluster.
+
+    Keyword arguments are passed to near_duplicate_clusters.
+    """
+    labels = near_duplicate_clusters(df, **kwargs)
+    return df.assign(is_duplicate=labels != np.arange(len(df)))
@@ -0,0 +1,290 @@
+"""Product file schema and the typed Parquet store shared by crawler, merge, ETL and review scripts."""
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pa_fs
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for the Parquet output / readers
+    pa = pa_csv = ds = pa_fs = pq = None
+
+PARQUET_ROOT = "lazada_parquet"
+
+# Column order written by lazada_crawler for every product row.
+PRODUCT_FIELDS = [
+    "ten_san_pham",
+    "gia_sale",
+    "gia_goc",
+    "rating",
+    "so_review",
+    "link_anh",
+    "shop",
+    "category",
+    "url_san_pham",
+]
+
+NUMERIC_FIELDS = {
+    "gia_sale": "float64",
+    "gia_goc": "float64",
+    "rating": "float64",
+    "so_review": "Int64",
+}
+
+# Names the review inputs go by in merged / third-party product files, in lookup order.
+REVIEW_SOURCE_ALIASES = {
+    "rating": ["rating", "Rating", "rating_score", "ratingScore"],
+    "so_review": ["so_review", "review_count", "review", "reviews"],
+    "url_san_pham": ["url_san_pham", "url", "productUrl", "item_url"],
+}
+
+# Item id in a product URL: .../pdp-i2038581815.html, .../ao-thun-i123-s456.html, or a bare pdp-i123.
+_PRODUCT_ID_PATTERN = r"-i(\d+)(?:-s\d+)?\.html"
+_PDP_ID_PATTERN = r"pdp-i(\d+)"
+_PRODUCT_ID_RE = re.compile(f"{_PRODUCT_ID_PATTERN}|{_PDP_ID_PATTERN}")
+
+# Crawl time in a file name: lazada_products_<slug>_YYYYMMDD_HHMMSS.csv, part-YYYYMMDD_HHMMSS.parquet
+_CRAWL_TIMESTAMP_RE = re.compile(r"(\d{8}_\d{6})")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet cần pyarrow: pip install pyarrow")
+
+
+def _slug(value):
+    slug = re.sub(r"[^a-z0-9_-]+", "_", str(value).strip().lower()).strip("_")
+    return slug or "keyword"
+
+
+def to_typed_frame(data):
+    """DataFrame with PRODUCT_FIELDS in order and numeric price / rating / review columns."""
+    df = pd.DataFrame(data)
+    for field in PRODUCT_FIELDS:
+        if field not in df.columns:
+            df[field] = None
+    df = df[PRODUCT_FIELDS]
+
+    for field, dtype in NUMERIC_FIELDS.items():
+        values = pd.to_numeric(df[field], errors="coerce")
+        if dtype == "Int64":
+            values = values.round()
+        df[field] = values.astype(dtype)
+    for field in PRODUCT_FIELDS:
+        if field not in NUMERIC_FIELDS:
+            df[field] = df[field].astype("string")
+    return df
+
+
+def product_id_from_url(url):
+    """Numeric Lazada item id of one product URL, or None if it has none."""
+    if not isinstance(url, str):
+        return None
+    match = _PRODUCT_ID_RE.search(url)
+    return (match.group(1) or match.group(2)) if match else None
+
+
+def product_ids_from_urls(urls):
+    """Vectorized product_id_from_url over a Series of URLs, as a "string" Series (NA if none)."""
+    urls = urls.astype("string")
+    ids = urls.str.extract(_PRODUCT_ID_PATTERN, expand=False).astype("string")
+    # Single-group patterns are much faster to extract; the bare pdp-i form is rare
+    missing = ids.isna() & urls.notna()
+    if missing.any():
+        ids[missing] = urls[missing].str.extract(_PDP_ID_PATTERN, expand=False)
+    return ids
+
+
+def canonical_product_ids(urls):
+    """product_ids_from_urls, with a fallback for URLs that carry no item id.
+
+    Those fall back to the URL normalized for scheme ("//", "http:" -> "https:"),
+    query string and fragment, so tracking variants of the same page still compare
+    equal. Missing URLs stay NA.
+    """
+    urls = urls.astype("string")
+    canonical = product_ids_from_urls(urls)
+
+    normalized = (
+        urls.str.strip()
+        .str.replace(r"[?#].*$", "", regex=True)
+        .str.replace(r"^(?:https?:)?//", "https://", regex=True)
+    )
+    return canonical.fillna(normalized).astype("string")
+
+
+def pin_product_schema(df):
+    """Cast the columns of a raw product frame to fixed dtypes, keeping their order.
+
+    NUMERIC_FIELDS get their numeric dtype (unparseable values become NA), every
+    other column becomes "string". Frames read from different files then share one
+    schema, so pd.concat never has to fall back to object columns.
+    """
+    pinned = {}
+    for col in df.columns:
+        dtype = NUMERIC_FIELDS.get(col)
+        if dtype is None:
+            pinned[col] = df[col].astype("string")
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        if dtype == "Int64":
+            values = values.round()
+        pinned[col] = values.astype(dtype)
+    return pd.DataFrame(pinned, index=df.index)
+
+
+def save_to_parquet(data, keyword, root=PARQUET_ROOT, crawl_date=None):
+    """Write one crawl as <root>/category_slug=<slug>/crawl_date=<YYYY-MM-DD>/part-<ts>.parquet."""
+    _require_pyarrow()
+    if not data:
+        print("⚠️ Không có dữ liệu để lưu.")
+        return None
+
+    crawl_date = crawl_date or time.strftime("%Y-%m-%d")
+    folder = os.path.join(root, f"category_slug={_slug(keyword)}", f"crawl_date={crawl_date}")
+    os.makedirs(folder, exist_ok=True)
+
+    filepath = os.path.join(folder, f"part-{time.strftime('%Y%m%d_%H%M%S')}.parquet")
+    table = pa.Table.from_pandas(to_typed_frame(data), preserve_index=False)
+    pq.write_table(table, filepath, compression="zstd")
+    return filepath
+
+
+def crawl_timestamp(path):
+    """Crawl time of a product file from its name, or the file's mtime if the name has none."""
+    match = _CRAWL_TIMESTAMP_RE.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def is_parquet_path(path):
+    path = Path(path)
+    return path.suffix == ".parquet" or (path.is_dir() and any(path.rglob("*.parquet")))
+
+
+def read_products(path, columns=None):
+    """Read a product CSV, a .parquet file or a partitioned Parquet directory.
+
+    `columns` projects the read: Parquet only decodes those columns, CSV only keeps
+    them. Columns missing from the file are simply absent from the result.
+    """
+    if is_parquet_path(path):
+        _require_pyarrow()
+        dataset = ds.dataset(str(path), format="parquet", partitioning="hive")
+        if columns is not None:
+            columns = [c for c in columns if c in dataset.schema.names]
+        return dataset.to_table(columns=columns).to_pandas()
+
+    usecols = None if columns is None else (lambda c: c in columns)
+    return pd.read_csv(path, encoding="utf-8-sig", usecols=usecols)
+
+
+def product_columns(path):
+    """Column names of a product file without reading its rows."""
+    if is_parquet_path(path):
+        _require_pyarrow()
+        return list(ds.dataset(str(path), format="parquet", partitioning="hive").schema.names)
+    return list(pd.read_csv(path, encoding="utf-8-sig", nrows=0).columns)
+
+
+def iter_product_chunks(path, chunksize=100_000, columns=None, csv_dtype=None):
+    """Yield DataFrames of at most `chunksize` rows, so a file never has to fit in memory.
+
+    csv_dtype is passed to pd.read_csv (e.g. str to keep CSV values verbatim).
+    """
+    if is_parquet_path(path):
+        _require_pyarrow()
+        dataset = ds.dataset(str(path), format="parquet", partitioning="hive")
+        if columns is not None:
+            columns = [c for c in columns if c in dataset.schema.names]
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+
+    usecols = None if columns is None else (lambda c: c in columns)
+    yield from pd.read_csv(path, encoding="utf-8-sig", usecols=usecols, chunksize=chunksize, dtype=csv_dtype)
+
+
+def resolve_aliases(columns, aliases):
+    """{field: [present column names, in alias order]} for every field of `aliases`."""
+    present = set(columns)
+    return {field: [name for name in names if name in present] for field, names in aliases.items()}
+
+
+def _read_string_columns(path, columns):
+    """Only `columns` of a product file as strings, memory-mapped where pyarrow is available."""
+    if is_parquet_path(path):
+        _require_pyarrow()
+        dataset = ds.dataset(
+            str(path), format="parquet", partitioning="hive",
+            filesystem=pa_fs.LocalFileSystem(use_mmap=True),
+        )
+        df = dataset.to_table(columns=columns).to_pandas()
+        return df.astype("string")
+    if pa_csv is not None:
+        table = pa_csv.read_csv(
+            pa.memory_map(str(path)),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={c: pa.string() for c in columns},
+                include_columns=columns,
+            ),
+        )
+        # pyarrow reads empty cells as "", pandas as NA; treat both as missing
+        return table.to_pandas().astype("string").replace("", pd.NA)
+    usecols = set(columns)
+    return pd.read_csv(
+        path, encoding="utf-8-sig", dtype=str, usecols=lambda c: c in usecols, memory_map=True
+    ).astype("string")
+
+
+def read_review_source(path, aliases=REVIEW_SOURCE_ALIASES):
+    """rating, so_review and url_san_pham of every product of a file, read through `aliases`.
+
+    The aliases are resolved once against the file's header / Parquet schema and only
+    the matching columns are decoded. Where a file has several aliases of one field the
+    first non-empty value per row wins, like chained `row.get(a) or row.get(b)`.
+    Returns a frame with url_san_pham ("string", NA if missing), so_review (int64,
+    truncated, 0 if missing or unparseable) and rating (float64, NaN if missing).
+    """
+    resolved = resolve_aliases(product_columns(path), aliases)
+    wanted = [name for names in resolved.values() for name in names]
+    raw = _read_string_columns(path, wanted) if wanted else pd.DataFrame(index=pd.RangeIndex(0))
+
+    fields = {}
+    for field, names in resolved.items():
+        values = pd.Series(pd.NA, index=raw.index, dtype="string")
+        for name in names:
+            values = values.fillna(raw[name])
+        fields[field] = values
+
+    review_count = pd.to_numeric(fields["so_review"], errors="coerce").astype("float64")
+    review_count = review_count.where(np.isfinite(review_count))
+    return pd.DataFrame({
+        "url_san_pham": fields["url_san_pham"],
+        "so_review": np.trunc(review_count).fillna(0).astype("int64"),
+        "rating": pd.to_numeric(fields["rating"], errors="coerce").astype("float64"),
+    })
+
+
+def reviewable_products(df):
+    """Rows of a read_review_source frame that get fake reviews: a URL, reviews and a rating."""
+    return df[df["url_san_pham"].notna() & (df["so_review"] > 0) & (df["rating"] > 0)]
+
+
+def parquet_partitions(root=PARQUET_ROOT):
+    """{category_slug: partition_dir} for every category under a Parquet root."""
+    partitions = {}
+    for part_dir in sorted(Path(root).glob("category_slug=*")):
+        if part_dir.is_dir():
+            partitions[part_dir.name.split("=", 1)[1]] = part_dir
+    return partitions
@@ -0,0 +1,69 @@
+"""Vectorized fake-rating generator shared by the review scripts.
+
+All n ratings of a product come from one multinomial draw over the star values; the
+sum is then corrected towards n * target_avg with a cumulative-sum pass over a random
+permutation instead of a per-element loop. Every call takes an explicit seed or
+numpy Generator, so a run is reproducible.
+"""
+import hashlib
+
+import numpy as np
+
+RATING_VALUES = np.arange(1, 6)
+
+# Star weights by target tier (same tiers and weights the review scripts always used).
+_TIER_WEIGHTS = [
+    (4.0, [1, 2, 5, 15, 25]),
+    (3.0, [3, 5, 15, 12, 8]),
+    (0.0, [15, 12, 10, 5, 2]),
+]
+
+
+def rating_probabilities(target_avg):
+    for threshold, weights in _TIER_WEIGHTS:
+        if target_avg >= threshold:
+            weights = np.asarray(weights, dtype=np.float64)
+            return weights / weights.sum()
+
+
+def product_rng(seed, product_id):
+    """Generator for one product, derived from the run seed and the product id.
+
+    The stream depends only on (seed, product_id), not on how many products were
+    generated before it, so any subset or ordering of products is reproducible.
+    """
+    digest = hashlib.sha256(str(product_id).encode("utf-8")).digest()
+    return np.random.default_rng([seed, int.from_bytes(digest[:8], "little")])
+
+
+def generate_ratings(n, target_avg, rng=None):
+    """n ratings in [1, 5] (2 decimals) whose sum equals n * target_avg, as a float64 array.
+
+    target_avg is clamped to [1, 5]. Integer stars are drawn with the tier weights,
+    then randomly chosen ratings are pushed to the bound (5 or 1) until the remaining
+    gap fits in one rating, which takes the fractional rest. rng may be a seed or a
+    numpy Generator.
+    """
+    if n <= 0:
+        return np.empty(0, dtype=np.float64)
+    rng = np.random.default_rng(rng)
+
+    target_avg = max(1.0, min(5.0, float(target_avg)))
+    counts = rng.multinomial(n, rating_probabilities(target_avg))
+    ratings = np.repeat(RATING_VALUES, counts).astype(np.float64)
+
+    diff = target_avg * n - ratings.sum()
+    if abs(diff) >= 0.01:
+        order = rng.permutation(n)
+        room = (5.0 - ratings[order]) if diff > 0 else (ratings[order] - 1.0)
+        filled = np.cumsum(room)
+        # Ratings before `last` move all the way to the bound, `last` takes the rest
+        last = min(int(np.searchsorted(filled, abs(diff))), n - 1)
+        step = room.copy()
+        step[last + 1:] = 0.0
+        step[last] = abs(diff) - (filled[last - 1] if last else 0.0)
+        ratings[order] += np.sign(diff) * step
+
+    ratings = np.round(ratings, 2)
+    rng.shuffle(ratings)
+    return ratings
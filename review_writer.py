@@ -0,0 +1,119 @@
+"""Streaming review CSV writer: fixed-size chunks, optional gzip / zstd, online rating stats."""
+import csv
+import gzip
+import os
+import shutil
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # only needed for .zst output
+    zstandard = None
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def with_compression_suffix(path, compression):
+    """path plus the suffix of `compression` (None, "gzip" or "zstd") unless already there."""
+    suffix = COMPRESSION_SUFFIXES[compression]
+    path = str(path)
+    return path if not suffix or path.endswith(suffix) else path + suffix
+
+
+def open_text_output(path, encoding="utf-8-sig"):
+    """Text handle for path, compressed according to its suffix (.gz / .zst)."""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding=encoding, newline="")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Output .zst cần zstandard: pip install zstandard")
+        return zstandard.open(path, "wt", encoding=encoding, newline="")
+    return open(path, "w", encoding=encoding, newline="")
+
+
+def open_text_input(path, encoding="utf-8-sig"):
+    """Read counterpart of open_text_output."""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding=encoding, newline="")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Input .zst cần zstandard: pip install zstandard")
+        return zstandard.open(path, "rt", encoding=encoding, newline="")
+    return open(path, "r", encoding=encoding, newline="")
+
+
+def concat_review_files(paths, output_path):
+    """Concatenate review CSVs that share one header into output_path, keeping the first header.
+
+    Inputs and output may each be plain, .gz or .zst; rows are copied as text, so the
+    result is byte-for-byte what one writer would have produced for the same rows.
+    """
+    with open_text_output(output_path) as out:
+        for i, path in enumerate(paths):
+            with open_text_input(path) as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out)
+    return output_path
+
+
+class ReviewStreamWriter:
+    """Writes reviews product by product without ever holding the whole review set.
+
+    Rows are buffered and written every `chunk_rows` rows, so memory is bounded by
+    one chunk plus the largest single product. Review / product counts and the star
+    distribution are accumulated as rows arrive, so no second pass over the output
+    is needed.
+    """
+
+    def __init__(self, path, fieldnames, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.path = str(path)
+        self.chunk_rows = chunk_rows
+        self._file = open_text_output(self.path)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(fieldnames)
+        self._buffer = []
+
+        self.total_reviews = 0
+        self.products = 0
+        self.rating_counts = np.zeros(6, dtype=np.int64)
+
+    def add_product(self, rows, ratings):
+        """rows: one tuple per review in fieldnames order; ratings: that product's ratings."""
+        if not len(ratings):
+            return
+        self._buffer.extend(rows)
+        self.total_reviews += len(ratings)
+        self.products += 1
+        stars = np.floor(np.asarray(ratings, dtype=np.float64)).astype(np.int64)
+        self.rating_counts += np.bincount(stars, minlength=6)[:6]
+        if len(self._buffer) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._writer.writerows(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+
+    def rating_distribution(self):
+        """{star: review count} for every star that occurs (a 4.37 rating counts as 4)."""
+        return {star: int(count) for star, count in enumerate(self.rating_counts) if count}
+
+    def close(self, remove_if_empty=False):
+        self.flush()
+        self._file.close()
+        if remove_if_empty and not self.total_reviews:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
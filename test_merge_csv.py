@@ -0,0 +1,38 @@
+"""Serial and parallel merge_csv_files write the same output."""
+import pandas as pd
+import pytest
+
+import merge_csv
+
+FIELDS = ["ten_san_pham", "gia_sale", "gia_goc", "rating", "so_review", "shop", "category", "url_san_pham"]
+
+
+@pytest.fixture
+def crawl_files(tmp_path):
+    rows = [
+        [["Ao", 100, 200, 4.5, 3, "007", "shirts", "https://www.lazada.vn/products/pdp-i1.html"],
+         ["Quan", 50, "", "", 0, "shop", "shirts", "https://www.lazada.vn/products/pdp-i2.html"]],
+        [["Ao (copy)", 90, 200, 5, 4, "007", "shirts", "//www.lazada.vn/products/ao-i1.html?spm=x"],
+         ["Giay", 99.5, 120, 3.8, 12, "", "shoes", "https://www.lazada.vn/products/pdp-i3.html"]],
+    ]
+    for i, file_rows in enumerate(rows):
+        path = tmp_path / f"lazada_products_x_2025010{i + 1}_000000.csv"
+        pd.DataFrame(file_rows, columns=FIELDS).to_csv(path, index=False, encoding="utf-8-sig")
+    return tmp_path
+
+
+def test_serial_and_parallel_merge_match(crawl_files):
+    pattern = str(crawl_files / "lazada_products_*.csv")
+    serial = merge_csv.merge_csv_files(pattern=pattern, output_file=str(crawl_files / "serial.csv"))
+    parallel = merge_csv.merge_csv_files(pattern=pattern, output_file=str(crawl_files / "parallel.csv"), workers=2)
+
+    with open(serial, encoding="utf-8-sig") as f:
+        serial_text = f.read()
+    with open(parallel, encoding="utf-8-sig") as f:
+        assert f.read() == serial_text
+
+    lines = serial_text.splitlines()
+    assert lines[0] == ",".join(FIELDS + ["product_id"])
+    # A column of whole prices keeps its integer form, text keeps its leading zeros
+    assert "Giay,99.5,120,3.8,12,,shoes,https://www.lazada.vn/products/pdp-i3.html,3" in lines
+    assert any(",007,shirts," in line for line in lines)
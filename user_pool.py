@@ -0,0 +1,39 @@
+"""Synthetic reviewer pool: a compact users table plus power-law review activity.
+
+Reviews reference users by integer id only; the (user_id, name) table is written once
+next to the reviews. Which user writes a review follows a Zipf-like law: the user of
+rank k is drawn with weight 1 / k**exponent, so a few users write many reviews and most
+write one or two (exponent 0 gives uniform activity).
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_USERS = 100_000
+DEFAULT_ACTIVITY_EXPONENT = 0.8
+
+USER_FIELDS = ["user_id", "name"]
+
+
+def build_users(n_users, first_names, last_names, seed):
+    """users table: user_id 1..n_users and a "Last First" name drawn from the two pools."""
+    rng = np.random.default_rng(seed)
+    last = np.asarray(last_names, dtype=object)[rng.integers(len(last_names), size=n_users)]
+    first = np.asarray(first_names, dtype=object)[rng.integers(len(first_names), size=n_users)]
+    return pd.DataFrame({
+        "user_id": np.arange(1, n_users + 1, dtype=np.int64),
+        "name": last + " " + first,
+    })
+
+
+def activity_cdf(n_users, exponent=DEFAULT_ACTIVITY_EXPONENT):
+    """Cumulative probability of user ids 1..n_users; user_id k has weight 1 / k**exponent."""
+    weights = np.arange(1, n_users + 1, dtype=np.float64) ** -float(exponent)
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def draw_user_ids(rng, n, cdf):
+    """n user ids (int64 array) drawn from rng according to an activity_cdf."""
+    ids = np.searchsorted(cdf, rng.random(n), side="right") + 1
+    # Guards against the last cdf entry rounding just below a draw
+    return np.minimum(ids, len(cdf))